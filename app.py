@@ -2,16 +2,29 @@
 Flask backend for Instagram Profile Analyzer
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, send_from_directory
 from flask_cors import CORS
+import orjson
+import atexit
+import logging
+import logging.handlers
 import os
+import queue
 import threading
-from datetime import datetime
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
-from scraper import InstagramScraper
+from scraper import InstagramScraper, extract_username
 from utils.ai_analyzer import ProfileAnalyzer
 from database import InstagramDatabase
+from utils.session_store import SessionStore
+from utils.rate_limiter import RateLimiter
+from utils.scheduler import IntervalScheduler
+from utils.log_sampling import RepeatedErrorFilter
+from utils.image_processor import purge_collages, purge_video_temp_files
+from utils.disk_cache import DiskCache
 
 # Load environment variables
 load_dotenv()
@@ -19,31 +32,227 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Workers only enqueue log records; a single listener thread writes them out.
+# Bursts of identical errors (e.g. repeated 429s) are collapsed into one line.
+log_queue = queue.Queue(-1)
+log_handler = logging.handlers.QueueHandler(log_queue)
+log_handler.addFilter(RepeatedErrorFilter(window_seconds=60))
+logger = logging.getLogger('analyzer')
+logger.setLevel(logging.INFO)
+logger.addHandler(log_handler)
+logger.propagate = False
+
+log_output = logging.StreamHandler()
+log_output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_output)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 # Configuration
 APIFY_API_TOKEN = os.getenv('APIFY_API_TOKEN')
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+APIFY_CONFIGURED = bool(APIFY_API_TOKEN)
+GOOGLE_CONFIGURED = bool(GOOGLE_API_KEY and GOOGLE_API_KEY != 'your_google_api_key_here')
+
+# Health payload never changes while the process runs, so serialize it once
+_HEALTH_BYTES = orjson.dumps({
+    'status': 'healthy',
+    'apify_configured': APIFY_CONFIGURED,
+    'google_configured': GOOGLE_CONFIGURED
+})
+
+# Shared database handle (connections are pooled per file)
+db = InstagramDatabase()
+
+# Store active analysis sessions (bounded LRU with TTL expiry)
+session_store = SessionStore(
+    max_sessions=int(os.getenv('MAX_SESSIONS', 128)),
+    ttl_seconds=int(os.getenv('SESSION_TTL', 3600))
+)
+SESSION_RETENTION = timedelta(days=int(os.getenv('SESSION_RETENTION_DAYS', 7)))
+
+
+def purge_old_sessions():
+    """Drop persisted session rows past the retention window"""
+    db.purge_sessions(datetime.now() - SESSION_RETENTION)
+
+
+def purge_old_collages():
+    """Delete collages no longer referenced by any retained session report, and orphaned temp videos"""
+    removed = purge_collages('output/collages', SESSION_RETENTION.total_seconds())
+    removed += purge_video_temp_files()
+    if removed:
+        logger.info("Purged %d old collage and temporary video files", removed)
+
+
+# The scraper's Apify result cache and the analyzer's Gemini cache, at their default TTLs
+response_caches = (
+    DiskCache(os.path.join('output', '.apify_cache')),
+    DiskCache(os.path.join('output', '.analysis_cache')),
+)
+
+
+def purge_response_caches():
+    """Delete expired cached Apify results and analyses"""
+    removed = sum(cache.purge() for cache in response_caches)
+    if removed:
+        logger.info("Purged %d expired cache entries", removed)
+
+
+# Periodic maintenance: keep the WAL small, refresh planner stats, expire sessions
+scheduler = IntervalScheduler()
+scheduler.add_job(db.checkpoint, 10 * 60)
+scheduler.add_job(session_store.gc, 5 * 60)
+scheduler.add_job(purge_old_sessions, 60 * 60)
+scheduler.add_job(purge_old_collages, 60 * 60)
+scheduler.add_job(purge_response_caches, 60 * 60)
+scheduler.add_job(db.optimize, 6 * 60 * 60)
+scheduler.start()
+atexit.register(scheduler.shutdown)
+
+# Bounded worker pool for analyses; requests beyond the queue limit get a 429
+ANALYZER_WORKERS = int(os.getenv('ANALYZER_WORKERS', 4))
+MAX_QUEUED_ANALYSES = int(os.getenv('MAX_QUEUED_ANALYSES', 16))
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYZER_WORKERS, thread_name_prefix='analysis')
+analysis_slots = threading.BoundedSemaphore(ANALYZER_WORKERS + MAX_QUEUED_ANALYSES)
+
+# One scraper per analysis worker thread, reused across analyses
+scraper_pool = threading.local()
+
+
+def get_scraper() -> InstagramScraper:
+    """Return this worker thread's scraper, creating it on first use"""
+    scraper = getattr(scraper_pool, 'scraper', None)
+    if scraper is None:
+        scraper = InstagramScraper(APIFY_API_TOKEN, use_database=True)
+        scraper_pool.scraper = scraper
+    return scraper
+
+
+# Proactive per-API rate limits (requests per minute)
+APIFY_LIMITER = RateLimiter(int(os.getenv('APIFY_RPM', 30)))
+GEMINI_LIMITER = RateLimiter(int(os.getenv('GEMINI_RPM', 50)))
 
-# Store active analysis sessions
-analysis_sessions = {}
+
+def json_response(obj) -> Response:
+    """Serialize obj with orjson into an application/json response"""
+    return Response(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), mimetype='application/json')
+
+
+def stream_report(report: dict, posts: list):
+    """
+    Yield a report as JSON chunks, encoding posts one at a time
+
+    Avoids holding the fully encoded report next to the session data.
+    """
+    head = orjson.dumps(report, option=orjson.OPT_NON_STR_KEYS)
+    yield head[:-1] + b',"posts":['
+    for idx, post in enumerate(posts):
+        yield (b',' if idx else b'') + orjson.dumps(post, option=orjson.OPT_NON_STR_KEYS)
+    yield b']}'
+
+
+def build_posts_preview(posts: list) -> list:
+    """Build the carousel preview shown while an analysis is running"""
+    return [
+        {
+            'url': post.get('url'),
+            'caption': post.get('caption', '')[:100],
+            'images': [img['url'] for img in post.get('images', [])[:1]],
+            'type': post.get('type')
+        }
+        for post in posts[:10]
+    ]
 
 
 class AnalysisSession:
     """Track analysis progress"""
-    def __init__(self, username):
+    def __init__(self, session_id, username):
+        self.session_id = session_id
         self.username = username
         self.status = 'initializing'
         self.progress = 0
         self.message = 'Starting analysis...'
         self.profile_data = None
         self.posts_data = []
+        self.posts_preview = None
         self.website_data = None
         self.analysis_result = None
         self.error = None
         self.started_at = datetime.now()
         self.completed_at = None
+        self.future = None
+
+    def update(self, **fields):
+        """Set progress fields and persist them"""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.persist()
+
+    def persist(self, include_payload=False):
+        """Write the session row so other app workers can see it"""
+        payload = orjson.dumps({
+            'profile': self.profile_data,
+            'posts': self.posts_data,
+            'posts_preview': self.posts_preview,
+            'website_data': self.website_data,
+            'analysis': self.analysis_result
+        }, option=orjson.OPT_NON_STR_KEYS) if include_payload else None
+
+        db.save_session(self.session_id, {
+            'username': self.username,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'started_at': self.started_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }, payload)
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a session from its sessions table row"""
+        session = cls(row['session_id'], row['username'])
+        session.status = row['status']
+        session.progress = row['progress']
+        session.message = row['message']
+        session.error = row['error']
+        session.started_at = datetime.fromisoformat(row['started_at'])
+        if row['completed_at']:
+            session.completed_at = datetime.fromisoformat(row['completed_at'])
+
+        if row['payload']:
+            payload = orjson.loads(row['payload'])
+            session.profile_data = payload['profile']
+            session.posts_data = payload['posts'] or []
+            session.posts_preview = payload['posts_preview']
+            session.website_data = payload['website_data']
+            session.analysis_result = payload['analysis']
+        return session
+
+
+def find_session(session_id):
+    """
+    Look up a session in this process, falling back to the database
+
+    Sessions started by another worker (or before a restart) are loaded
+    from the sessions table. Finished ones are cached locally.
+    """
+    session = session_store.get(session_id)
+    if session:
+        return session
+
+    row = db.get_session(session_id)
+    if not row:
+        return None
+
+    session = AnalysisSession.from_row(row)
+    if session.status in ('completed', 'error'):
+        session_store.put(session_id, session)
+    return session
 
 
-def run_analysis(session_id: str, profile_url: str, results_limit: int = 10):
+def run_analysis(session_id: str, profile_url: str, results_limit: int = 10, force_refresh: bool = False):
     """
     Run profile analysis in background thread with parallel processing
 
@@ -51,42 +260,64 @@ def run_analysis(session_id: str, profile_url: str, results_limit: int = 10):
         session_id: Session ID
         profile_url: Instagram profile URL
         results_limit: Number of posts to fetch (default: 10)
+        force_refresh: Bypass cached actor results and analyses
     """
-    session = analysis_sessions[session_id]
+    session = session_store.get(session_id)
+    if not session:
+        # Evicted from the store before a worker picked it up; don't leave the
+        # persisted row claiming the analysis is still starting
+        logger.warning("Session %s was evicted before its analysis started", session_id)
+        row = db.get_session(session_id)
+        if row:
+            error = 'Session expired before the analysis started'
+            AnalysisSession.from_row(row).update(status='error', error=error, message=f'Error: {error}')
+        return
+
+    def show_rate_limit_wait(api_name):
+        def on_wait(delay):
+            session.update(message=f'Waiting {delay:.0f}s for {api_name} rate limit...')
+        return on_wait
 
     try:
         # Initialize scraper
-        session.status = 'scraping'
-        session.progress = 10
-        session.message = 'Fetching Instagram profile...'
+        session.update(status='scraping', progress=10, message='Fetching Instagram profile...')
 
-        scraper = InstagramScraper(APIFY_API_TOKEN, use_database=True)
+        scraper = get_scraper()
+
+        # Created up front so collages are read for Gemini while the rest are still generating
+        analyzer = ProfileAnalyzer(GOOGLE_API_KEY) if GOOGLE_CONFIGURED else None
+
+        APIFY_LIMITER.acquire(on_wait=show_rate_limit_wait('Apify'))
 
         # Scrape profile
-        session.progress = 20
-        session.message = 'Downloading posts...'
+        session.update(progress=20, message='Downloading posts...')
 
-        result = scraper.scrape_profile(profile_url, results_limit)
+        result = scraper.scrape_profile(
+            profile_url,
+            results_limit,
+            force_refresh=force_refresh,
+            on_collage=analyzer.prefetch_collage if analyzer else None
+        )
 
         if not result:
-            session.status = 'error'
-            session.error = 'Failed to fetch profile data'
+            session.update(status='error', error='Failed to fetch profile data')
             return
 
         session.profile_data = result['profile']
         session.posts_data = result['posts']
+        session.posts_preview = build_posts_preview(session.posts_data)
         session.website_data = result.get('website_data')
 
         session.progress = 60
         session.message = 'Generating collages complete. Starting AI analysis...'
+        session.persist(include_payload=True)
 
         # Run AI analysis
-        if GOOGLE_API_KEY and GOOGLE_API_KEY != 'your_google_api_key_here':
-            session.status = 'analyzing'
-            session.progress = 70
-            session.message = 'Analyzing profile with AI...'
+        if analyzer:
+            session.update(status='analyzing', progress=70)
 
-            analyzer = ProfileAnalyzer(GOOGLE_API_KEY)
+            GEMINI_LIMITER.acquire(on_wait=show_rate_limit_wait('Gemini'))
+            session.update(message='Analyzing profile with AI...')
 
             # Get collage paths
             collage_paths = [
@@ -99,18 +330,17 @@ def run_analysis(session_id: str, profile_url: str, results_limit: int = 10):
                 session.posts_data,
                 session.profile_data,
                 session.website_data,
-                collage_paths
+                collage_paths,
+                force_refresh=force_refresh
             )
 
             session.analysis_result = analysis
 
             # Save analysis to database
-            db = InstagramDatabase()
             db.save_analysis(session.username, analysis)
-            db.close()
 
         else:
-            session.message = 'AI analysis skipped (API key not configured)'
+            session.update(message='AI analysis skipped (API key not configured)')
             # Use fallback
             analyzer = ProfileAnalyzer('dummy')
             session.analysis_result = analyzer._generate_fallback_analysis(
@@ -123,16 +353,11 @@ def run_analysis(session_id: str, profile_url: str, results_limit: int = 10):
         session.progress = 100
         session.message = 'Analysis complete!'
         session.completed_at = datetime.now()
-
-        scraper.close()
+        session.persist(include_payload=True)
 
     except Exception as e:
-        session.status = 'error'
-        session.error = str(e)
-        session.message = f'Error: {str(e)}'
-        print(f"Analysis error: {e}")
-        import traceback
-        traceback.print_exc()
+        session.update(status='error', error=str(e), message=f'Error: {str(e)}')
+        logger.exception("Analysis failed for %s", session.username)
 
 
 @app.route('/')
@@ -147,27 +372,37 @@ def start_analysis():
     data = request.json
     profile_url = data.get('profile_url', '')
     results_limit = data.get('results_limit', 10)
+    force_refresh = bool(data.get('force_refresh', False))
 
     if not profile_url:
-        return jsonify({'error': 'Profile URL is required'}), 400
+        return json_response({'error': 'Profile URL is required'}), 400
 
     # Create session
-    scraper = InstagramScraper(APIFY_API_TOKEN)
-    username = scraper.extract_username_from_url(profile_url)
-
-    session_id = f"{username}_{datetime.now().timestamp()}"
-    session = AnalysisSession(username)
-    analysis_sessions[session_id] = session
+    username = extract_username(profile_url)
 
-    # Start analysis in background thread
-    thread = threading.Thread(
-        target=run_analysis,
-        args=(session_id, profile_url, results_limit)
-    )
-    thread.daemon = True
-    thread.start()
+    # Reject instead of queueing without bound when all workers are busy
+    if not analysis_slots.acquire(blocking=False):
+        return json_response({'error': 'Too many analyses in progress'}), 429, {'Retry-After': '30'}
 
-    return jsonify({
+    try:
+        session_id = f"{username}_{datetime.now().timestamp()}"
+        session = AnalysisSession(session_id, username)
+        session.persist()
+        session_store.put(session_id, session)
+
+        # Run analysis on the worker pool
+        session.future = analysis_executor.submit(
+            run_analysis, session_id, profile_url, results_limit, force_refresh
+        )
+    except Exception:
+        # No future owns the slot yet, so hand it back here
+        analysis_slots.release()
+        logger.exception("Could not start analysis for %s", username)
+        return json_response({'error': 'Could not start analysis'}), 500
+
+    session.future.add_done_callback(lambda _: analysis_slots.release())
+
+    return json_response({
         'session_id': session_id,
         'username': username,
         'message': 'Analysis started'
@@ -177,75 +412,82 @@ def start_analysis():
 @app.route('/api/status/<session_id>')
 def get_status(session_id):
     """Get analysis status"""
-    session = analysis_sessions.get(session_id)
+    session = find_session(session_id)
 
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}), 404
 
-    response = {
-        'status': session.status,
-        'progress': session.progress,
-        'message': session.message,
-        'username': session.username
-    }
+    status, error = session.status, session.error
 
-    # Include posts for carousel during processing
-    if session.posts_data:
-        response['posts_preview'] = [
-            {
-                'url': post.get('url'),
-                'caption': post.get('caption', '')[:100],
-                'images': [img['url'] for img in post.get('images', [])[:1]],
-                'type': post.get('type')
-            }
-            for post in session.posts_data[:10]
-        ]
+    # Surface failures that escaped run_analysis itself
+    if session.future and session.future.done() and session.future.exception():
+        status, error = 'error', str(session.future.exception())
+
+    # Unchanged polls are answered from the ETag alone, without building a body
+    etag = (
+        f"{status}-{session.progress}-{len(session.posts_data or [])}-"
+        f"{zlib.crc32(session.message.encode()):08x}"
+    )
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        response = {
+            'status': status,
+            'progress': session.progress,
+            'message': session.message,
+            'username': session.username
+        }
 
-    if session.status == 'error':
-        response['error'] = session.error
+        # Include posts for carousel during processing
+        if session.posts_preview:
+            response['posts_preview'] = session.posts_preview
 
-    return jsonify(response)
+        if status == 'error':
+            response['error'] = error
+
+        resp = json_response(response)
+
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
 
 
 @app.route('/api/report/<session_id>')
 def get_report(session_id):
     """Get analysis report"""
-    session = analysis_sessions.get(session_id)
+    session = find_session(session_id)
 
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}), 404
 
     if session.status != 'completed':
-        return jsonify({'error': 'Analysis not completed'}), 400
+        return json_response({'error': 'Analysis not completed'}), 400
 
-    # Build complete report
+    # Build complete report; posts are streamed separately
     report = {
         'username': session.username,
         'profile': session.profile_data,
         'website_data': session.website_data,
         'analysis': session.analysis_result,
-        'posts': session.posts_data,
         'started_at': session.started_at.isoformat(),
         'completed_at': session.completed_at.isoformat()
     }
 
-    return jsonify(report)
+    return Response(stream_report(report, session.posts_data), mimetype='application/json')
 
 
 @app.route('/collages/<path:filename>')
 def serve_collage(filename):
-    """Serve collage images"""
-    return send_from_directory('output/collages', filename)
+    """Serve collage images (filenames are content-hashed, so cache them for good)"""
+    response = send_from_directory('output/collages', filename, conditional=True, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'apify_configured': bool(APIFY_API_TOKEN),
-        'google_configured': bool(GOOGLE_API_KEY and GOOGLE_API_KEY != 'your_google_api_key_here')
-    })
+    return Response(_HEALTH_BYTES, mimetype='application/json')
 
 
 if __name__ == '__main__':
@@ -257,8 +499,8 @@ if __name__ == '__main__':
     print("\n" + "="*60)
     print("Instagram Profile Analyzer - Starting Server")
     print("="*60)
-    print(f"Apify API: {'✓ Configured' if APIFY_API_TOKEN else '✗ Not configured'}")
-    print(f"Google Gemini API: {'✓ Configured' if GOOGLE_API_KEY and GOOGLE_API_KEY != 'your_google_api_key_here' else '✗ Not configured'}")
+    print(f"Apify API: {'✓ Configured' if APIFY_CONFIGURED else '✗ Not configured'}")
+    print(f"Google Gemini API: {'✓ Configured' if GOOGLE_CONFIGURED else '✗ Not configured'}")
     print("="*60)
     print("\nServer running at: http://localhost:8080")
     print("="*60 + "\n")
@@ -2,85 +2,306 @@
 Database module for storing Instagram data
 """
 
+import os
+import queue
 import sqlite3
-import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+import orjson
+
+
+# Applied once to every pooled connection when it is opened. The page cache is
+# per connection (up to 15 with overflow readers), so it stays at 16 MB each;
+# mmap covers larger reads. analysis_limit keeps PRAGMA optimize's ANALYZE cheap.
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA analysis_limit=400',
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+)
+
+# Bump when the schema changes and add a step to InstagramDatabase._migrate
+SCHEMA_VERSION = 1
+
+
+class _PoolManager:
+    """
+    Shared connections for one SQLite file: a single writer connection
+    serialized by a lock, plus a queue of reader connections that can run
+    concurrently under WAL. When every pooled reader is busy, up to
+    max_overflow extra readers are opened and closed again after use.
+
+    An in-memory database exists only inside the connection that created it,
+    so for ':memory:' the pool keeps a single connection and hands it to
+    readers under the writer lock.
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_path: str, reader_count: int, max_overflow: int = 0):
+        self.db_path = db_path
+        self.schema_ready = False
+        self.shared = db_path == ':memory:'
+        self._writer_lock = threading.RLock()
+        self.writer_conn = self._connect()
+        self._readers = queue.Queue()
+        self._overflow = threading.BoundedSemaphore(max_overflow) if max_overflow > 0 else None
+        if not self.shared:
+            for _ in range(reader_count):
+                self._readers.put(self._connect())
+
+    @classmethod
+    def get(cls, db_path: str) -> '_PoolManager':
+        """Return the process-wide pool for db_path, creating it on first use"""
+        with cls._pools_lock:
+            pool = cls._pools.get(db_path)
+            if pool is None:
+                reader_count = int(os.getenv('DB_READER_POOL_SIZE', 4))
+                max_overflow = int(os.getenv('DB_READER_MAX_OVERFLOW', 10))
+                pool = cls(db_path, reader_count, max_overflow)
+                cls._pools[db_path] = pool
+            return pool
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection and apply the pool PRAGMAs
+
+        Connections run in autocommit mode (isolation_level=None) so the
+        sqlite3 module never opens implicit transactions; writer() issues
+        BEGIN IMMEDIATE / COMMIT itself.
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None,
+            timeout=30,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def writer(self, transaction: bool = True):
+        """
+        Yield the writer connection inside a BEGIN IMMEDIATE transaction
+
+        The lock is reentrant: a writer() opened while this thread already has
+        a transaction runs as a SAVEPOINT inside it, so several saves can share
+        one commit. With transaction=False the connection is only locked, for
+        statements such as checkpoints that must run outside a transaction.
+        """
+        with self._writer_lock:
+            conn = self.writer_conn
+            if not transaction:
+                yield conn
+                return
+
+            if conn.in_transaction:
+                conn.execute('SAVEPOINT nested_write')
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK TO nested_write')
+                    conn.execute('RELEASE nested_write')
+                    raise
+                conn.execute('RELEASE nested_write')
+                return
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    @contextmanager
+    def reader(self):
+        """Borrow a reader connection, returning it to the pool afterwards"""
+        if self.shared:
+            with self._writer_lock:
+                yield self.writer_conn
+            return
+
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            if self._overflow is None or not self._overflow.acquire(blocking=False):
+                conn = self._readers.get()
+            else:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    self._overflow.release()
+                    raise
+                try:
+                    yield conn
+                finally:
+                    conn.close()
+                    self._overflow.release()
+                return
+
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
 
 
 class InstagramDatabase:
+    # Tables rebuilt by migrations; {table} lets _migrate create them under a temporary name
+    _USERS_DDL = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            full_name TEXT,
+            profile_pic_url TEXT,
+            bio TEXT,
+            website TEXT,
+            follower_count INTEGER,
+            following_count INTEGER,
+            is_verified BOOLEAN,
+            is_private BOOLEAN,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    '''
+
+    _POSTS_DDL = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            short_code TEXT,
+            type TEXT,
+            caption TEXT,
+            timestamp TIMESTAMP,
+            likes_count INTEGER,
+            comments_count INTEGER,
+            url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    '''
+
+    _IMAGES_DDL = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id TEXT,
+            url TEXT,
+            is_thumbnail BOOLEAN,
+            type TEXT,
+            local_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (post_id) REFERENCES posts(id),
+            UNIQUE (post_id, url)
+        )
+    '''
+
+    _VIDEOS_DDL = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id TEXT,
+            url TEXT,
+            view_count INTEGER,
+            local_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (post_id) REFERENCES posts(id),
+            UNIQUE (post_id, url)
+        )
+    '''
+
     def __init__(self, db_path="instagram_data.db"):
-        """Initialize database connection and create tables"""
+        """Attach to the shared connection pool and create tables on first use"""
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.create_tables()
+        self.pool = _PoolManager.get(db_path)
+        if not self.pool.schema_ready:
+            self.create_tables()
+            self.pool.schema_ready = True
 
     def create_tables(self):
-        """Create necessary database tables"""
-        cursor = self.conn.cursor()
+        """Create necessary database tables, migrating an older schema first"""
+        with self.pool.writer(transaction=False) as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            has_tables = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+            ).fetchone() is not None
+
+            if has_tables and version < SCHEMA_VERSION:
+                # Tables are rebuilt while other tables still reference them, which
+                # SQLite only allows with foreign keys off (a no-op inside a transaction)
+                conn.execute('PRAGMA foreign_keys=OFF')
+                try:
+                    with self.pool.writer() as tx:
+                        self._migrate(tx, version)
+                        self._check_foreign_keys(tx)
+                finally:
+                    conn.execute('PRAGMA foreign_keys=ON')
+
+            with self.pool.writer() as tx:
+                self._create_tables(tx)
+                tx.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _migrate(self, conn: sqlite3.Connection, version: int):
+        """
+        Bring a database created by an older version up to SCHEMA_VERSION
+
+        Version 0 (no user_version) tables lack the WITHOUT ROWID layout and the
+        UNIQUE(post_id, url) media constraints the upserts rely on; CREATE TABLE
+        IF NOT EXISTS never changes an existing table, so each one is rebuilt and
+        its rows copied over. Users and posts without an id cannot live in a
+        WITHOUT ROWID table and are dropped; duplicate media rows keep the first.
+        """
+        if version < 1:
+            print("Migrating database schema to version 1...")
+            rebuilds = (
+                ('users', self._USERS_DDL, 'WHERE id IS NOT NULL AND id != \'\''),
+                ('posts', self._POSTS_DDL, 'WHERE id IS NOT NULL AND id != \'\''),
+                ('images', self._IMAGES_DDL, 'ORDER BY id'),
+                ('videos', self._VIDEOS_DDL, 'ORDER BY id'),
+            )
+            for table, ddl, copy_filter in rebuilds:
+                new_table = f'{table}_v1'
+                conn.execute(f'DROP TABLE IF EXISTS {new_table}')
+                conn.execute(ddl.format(table=new_table))
+                columns = ', '.join(
+                    row['name'] for row in conn.execute(f'PRAGMA table_info({new_table})')
+                    if row['name'] in {col['name'] for col in conn.execute(f'PRAGMA table_info({table})')}
+                )
+                conn.execute(f'INSERT OR IGNORE INTO {new_table} ({columns}) '
+                             f'SELECT {columns} FROM {table} {copy_filter}')
+                conn.execute(f'DROP TABLE {table}')
+                conn.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+
+    @staticmethod
+    def _check_foreign_keys(conn: sqlite3.Connection):
+        """Report rows left pointing at a parent the migration dropped"""
+        violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+        if violations:
+            tables = sorted({row[0] for row in violations})
+            print(f"Warning: {len(violations)} rows reference missing parents in {', '.join(tables)}")
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        """Run the schema DDL on the given connection"""
+        cursor = conn.cursor()
 
         # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT,
-                profile_pic_url TEXT,
-                bio TEXT,
-                website TEXT,
-                follower_count INTEGER,
-                following_count INTEGER,
-                is_verified BOOLEAN,
-                is_private BOOLEAN,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        cursor.execute(self._USERS_DDL.format(table='users'))
 
         # Posts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posts (
-                id TEXT PRIMARY KEY,
-                user_id TEXT,
-                short_code TEXT,
-                type TEXT,
-                caption TEXT,
-                timestamp TIMESTAMP,
-                likes_count INTEGER,
-                comments_count INTEGER,
-                url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        cursor.execute(self._POSTS_DDL.format(table='posts'))
 
         # Images table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id TEXT,
-                url TEXT,
-                is_thumbnail BOOLEAN,
-                type TEXT,
-                local_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (post_id) REFERENCES posts(id)
-            )
-        ''')
+        cursor.execute(self._IMAGES_DDL.format(table='images'))
 
         # Videos table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS videos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id TEXT,
-                url TEXT,
-                view_count INTEGER,
-                local_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (post_id) REFERENCES posts(id)
-            )
-        ''')
+        cursor.execute(self._VIDEOS_DDL.format(table='videos'))
 
         # Scraping sessions table
         cursor.execute('''
@@ -108,102 +329,238 @@ class InstagramDatabase:
             )
         ''')
 
-        self.conn.commit()
-
-    def save_user(self, user_data: Dict[str, Any]):
-        """Save or update user data"""
-        cursor = self.conn.cursor()
+        # Analysis sessions table (progress shared across app workers)
         cursor.execute('''
-            INSERT OR REPLACE INTO users
-            (id, username, full_name, profile_pic_url, bio, website, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                username TEXT,
+                status TEXT,
+                progress INTEGER,
+                message TEXT,
+                error TEXT,
+                started_at TIMESTAMP,
+                completed_at TIMESTAMP,
+                payload BLOB
+            )
+        ''')
+
+        # Indexes (users.username is already indexed by its UNIQUE constraint)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_user_id_ts ON posts(user_id, timestamp DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_post_id ON images(post_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_videos_post_id ON videos(post_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_username ON analysis_results(username)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at)')
+
+        # Refresh planner statistics only where SQLite thinks they are stale,
+        # instead of a full ANALYZE of every table on each start
+        cursor.execute('PRAGMA optimize')
+
+    def transaction(self):
+        """
+        Group several save calls into one transaction (a single commit)
+
+        Usage:
+            with db.transaction():
+                db.save_posts_batch(...)
+                db.log_scraping_session(...)
+        """
+        return self.pool.writer()
+
+    def save_user(self, profile: Dict[str, Any]):
+        """Save or update user data from a scraped profile"""
+        with self.pool.writer() as conn:
+            self._save_user_stmt(conn, profile)
+
+    def _save_user_stmt(self, conn: sqlite3.Connection, profile: Dict[str, Any]):
+        """
+        Upsert a user row on a connection that is already in a transaction
+
+        Args:
+            conn: Writer connection
+            profile: Profile dict as built by InstagramScraper.fetch_user_profile;
+                missing fields keep their stored values. Skipped without an ownerId,
+                since users is keyed on it, and for profiles read back by
+                get_user_fresh (from_cache), whose upsert would renew updated_at
+                and keep a stale profile fresh forever
+        """
+        if not profile.get('ownerId') or not profile.get('username') or profile.get('from_cache'):
+            return
+
+        # Usernames can be changed and then claimed by another account, so a
+        # stored row under a different id would break UNIQUE(username). That
+        # row's name is stale: drop it and detach its posts, which get their
+        # user_id back when the old account is scraped under its new name
+        stale_ids = [
+            (row[0],) for row in conn.execute(
+                'SELECT id FROM users WHERE username = ? AND id != ?',
+                (profile['username'], profile['ownerId'])
+            )
+        ]
+        if stale_ids:
+            conn.executemany('UPDATE posts SET user_id = NULL WHERE user_id = ?', stale_ids)
+            conn.executemany('DELETE FROM users WHERE id = ?', stale_ids)
+
+        conn.execute('''
+            INSERT INTO users
+            (id, username, full_name, profile_pic_url, bio, website,
+             follower_count, following_count, is_verified, is_private, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(id) DO UPDATE SET
+                username = excluded.username,
+                full_name = excluded.full_name,
+                profile_pic_url = excluded.profile_pic_url,
+                bio = COALESCE(excluded.bio, users.bio),
+                website = COALESCE(excluded.website, users.website),
+                follower_count = COALESCE(excluded.follower_count, users.follower_count),
+                following_count = COALESCE(excluded.following_count, users.following_count),
+                is_verified = COALESCE(excluded.is_verified, users.is_verified),
+                is_private = COALESCE(excluded.is_private, users.is_private),
+                updated_at = CURRENT_TIMESTAMP
         ''', (
-            user_data.get('ownerId'),
-            user_data.get('ownerUsername'),
-            user_data.get('ownerFullName'),
-            user_data.get('ownerProfilePicUrl'),
-            user_data.get('bio', ''),
-            user_data.get('website', '')
+            profile.get('ownerId'),
+            profile.get('username'),
+            profile.get('full_name'),
+            profile.get('profile_pic_url'),
+            profile.get('bio'),
+            profile.get('website'),
+            profile.get('followers'),
+            profile.get('following'),
+            profile.get('is_verified'),
+            profile.get('is_private')
         ))
-        self.conn.commit()
+
+    @staticmethod
+    def _profile_from_post(post: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a partial profile from the owner fields of a processed post"""
+        return {
+            'ownerId': post.get('ownerId'),
+            'username': post.get('ownerUsername'),
+            'full_name': post.get('ownerFullName'),
+            'profile_pic_url': post.get('ownerProfilePicUrl')
+        }
+
+    def get_user_fresh(self, username: str, ttl: int = 3600) -> Optional[Dict[str, Any]]:
+        """
+        Get a stored profile if it was updated within the last ttl seconds
+
+        Args:
+            username: Instagram username
+            ttl: Maximum age of the row in seconds
+
+        Returns:
+            Profile dict in the fetch_user_profile shape with from_cache set,
+            or None if missing or stale
+        """
+        with self.pool.reader() as conn:
+            row = conn.execute('''
+                SELECT * FROM users
+                WHERE username = ? AND updated_at >= datetime('now', ?)
+            ''', (username, f'-{int(ttl)} seconds')).fetchone()
+
+        if not row:
+            return None
+
+        return {
+            'username': row['username'],
+            'full_name': row['full_name'] or '',
+            'profile_pic_url': row['profile_pic_url'] or '',
+            'bio': row['bio'] or '',
+            'website': row['website'] or '',
+            'ownerId': row['id'],
+            'followers': row['follower_count'] or 0,
+            'following': row['following_count'] or 0,
+            'is_verified': bool(row['is_verified']),
+            'is_private': bool(row['is_private']),
+            'from_cache': True
+        }
 
     def save_post(self, post_data: Dict[str, Any]):
         """Save a single post"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO posts
+        with self.pool.writer() as conn:
+            self._save_post_stmt(conn, [post_data])
+
+    def _save_post_stmt(self, conn: sqlite3.Connection, posts: List[Dict[str, Any]]):
+        """
+        Write posts with their images and videos using one executemany per table
+
+        The connection must already be in a transaction; nothing is committed here.
+        Posts without an id are skipped, since posts is keyed on it.
+        """
+        posts = [post for post in posts if post.get('id')]
+        post_rows = [
+            (
+                post['id'],
+                post.get('ownerId') or None,
+                post['shortCode'],
+                post['type'],
+                post['caption'],
+                post['timestamp'],
+                post['likesCount'],
+                post['commentsCount'],
+                post['url']
+            )
+            for post in posts
+        ]
+        image_rows = [
+            (post['id'], img['url'], img['is_thumbnail'], img['type'])
+            for post in posts
+            for img in post.get('images', [])
+        ]
+        video_rows = [
+            (post['id'], video['url'], video.get('viewCount', 0))
+            for post in posts
+            for video in post.get('videos', [])
+        ]
+
+        # Upsert keeps the existing row (and its media) instead of delete + insert
+        conn.executemany('''
+            INSERT INTO posts
             (id, user_id, short_code, type, caption, timestamp, likes_count, comments_count, url)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            post_data['id'],
-            post_data.get('ownerId'),
-            post_data['shortCode'],
-            post_data['type'],
-            post_data['caption'],
-            post_data['timestamp'],
-            post_data['likesCount'],
-            post_data['commentsCount'],
-            post_data['url']
-        ))
-
-        # Save images
-        for img in post_data.get('images', []):
-            cursor.execute('''
-                INSERT INTO images (post_id, url, is_thumbnail, type)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                post_data['id'],
-                img['url'],
-                img['is_thumbnail'],
-                img['type']
-            ))
-
-        # Save videos
-        for video in post_data.get('videos', []):
-            cursor.execute('''
-                INSERT INTO videos (post_id, url, view_count)
-                VALUES (?, ?, ?)
-            ''', (
-                post_data['id'],
-                video['url'],
-                video.get('viewCount', 0)
-            ))
-
-        self.conn.commit()
-
-    def save_posts_batch(self, username: str, posts: List[Dict[str, Any]]) -> Dict[str, int]:
-        """Save multiple posts and return statistics"""
-        stats = {
-            'posts_saved': 0,
-            'images_saved': 0,
-            'videos_saved': 0
+            ON CONFLICT(id) DO UPDATE SET
+                user_id = COALESCE(excluded.user_id, posts.user_id),
+                caption = excluded.caption,
+                likes_count = excluded.likes_count,
+                comments_count = excluded.comments_count
+        ''', post_rows)
+        # Media already stored for a post is skipped via UNIQUE(post_id, url)
+        conn.executemany('''
+            INSERT OR IGNORE INTO images (post_id, url, is_thumbnail, type)
+            VALUES (?, ?, ?, ?)
+        ''', image_rows)
+        conn.executemany('''
+            INSERT OR IGNORE INTO videos (post_id, url, view_count)
+            VALUES (?, ?, ?)
+        ''', video_rows)
+
+    def save_posts_batch(self, username: str, posts: List[Dict[str, Any]],
+                         profile: Dict[str, Any] = None) -> Dict[str, int]:
+        """Save multiple posts (and their owner's profile) in a single transaction and return statistics"""
+        with self.pool.writer() as conn:
+            # Save user data from the profile, or from the first post's owner fields
+            if profile:
+                self._save_user_stmt(conn, profile)
+            elif posts:
+                self._save_user_stmt(conn, self._profile_from_post(posts[0]))
+            self._save_post_stmt(conn, posts)
+
+        posts = [post for post in posts if post.get('id')]
+        return {
+            'posts_saved': len(posts),
+            'images_saved': sum(len(post.get('images', [])) for post in posts),
+            'videos_saved': sum(len(post.get('videos', [])) for post in posts)
         }
 
-        # Save user data from first post
-        if posts:
-            self.save_user(posts[0])
-
-        for post in posts:
-            self.save_post(post)
-            stats['posts_saved'] += 1
-            stats['images_saved'] += len(post.get('images', []))
-            stats['videos_saved'] += len(post.get('videos', []))
-
-        return stats
-
     def log_scraping_session(self, username: str, posts_fetched: int, status: str, started_at: datetime):
         """Log a scraping session"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO scraping_sessions (username, posts_fetched, status, started_at)
-            VALUES (?, ?, ?, ?)
-        ''', (username, posts_fetched, status, started_at.isoformat()))
-        self.conn.commit()
+        with self.pool.writer() as conn:
+            conn.execute('''
+                INSERT INTO scraping_sessions (username, posts_fetched, status, started_at)
+                VALUES (?, ?, ?, ?)
+            ''', (username, posts_fetched, status, started_at.isoformat()))
 
     def save_analysis(self, username: str, analysis_data: Dict[str, Any]):
         """Save analysis results"""
-        cursor = self.conn.cursor()
-
         # Extract summary data
         summary = analysis_data.get('summary', {})
         if isinstance(summary, dict):
@@ -215,62 +572,109 @@ class InstagramDatabase:
             openers = []
             keywords = []
 
-        cursor.execute('''
-            INSERT INTO analysis_results
-            (username, summary, openers, keywords, detailed_report, confidence_scores)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            username,
-            summary_text,
-            json.dumps(openers),
-            json.dumps(keywords),
-            json.dumps(analysis_data.get('detailed_report', {})),
-            json.dumps(analysis_data.get('confidence_scores', {}))
-        ))
-        self.conn.commit()
+        with self.pool.writer() as conn:
+            conn.execute('''
+                INSERT INTO analysis_results
+                (username, summary, openers, keywords, detailed_report, confidence_scores)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                username,
+                summary_text,
+                orjson.dumps(openers).decode(),
+                orjson.dumps(keywords).decode(),
+                orjson.dumps(analysis_data.get('detailed_report', {})).decode(),
+                orjson.dumps(analysis_data.get('confidence_scores', {})).decode()
+            ))
+
+    def save_session(self, session_id: str, record: Dict[str, Any], payload: bytes = None):
+        """
+        Insert or update an analysis session row
+
+        Args:
+            session_id: Session ID
+            record: username, status, progress, message, error, started_at, completed_at
+            payload: Serialized session data; the stored payload is kept when None
+        """
+        with self.pool.writer() as conn:
+            conn.execute('''
+                INSERT INTO sessions
+                (session_id, username, status, progress, message, error, started_at, completed_at, payload)
+                VALUES (:session_id, :username, :status, :progress, :message, :error, :started_at, :completed_at, :payload)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    status = excluded.status,
+                    progress = excluded.progress,
+                    message = excluded.message,
+                    error = excluded.error,
+                    completed_at = excluded.completed_at,
+                    payload = COALESCE(excluded.payload, sessions.payload)
+            ''', {**record, 'session_id': session_id, 'payload': payload})
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get an analysis session row, or None if it does not exist"""
+        with self.pool.reader() as conn:
+            row = conn.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def purge_sessions(self, older_than: datetime) -> int:
+        """Delete analysis session rows started before older_than; returns rows removed"""
+        with self.pool.writer() as conn:
+            cursor = conn.execute('DELETE FROM sessions WHERE started_at < ?', (older_than.isoformat(),))
+            return cursor.rowcount
+
+    def checkpoint(self):
+        """Checkpoint the WAL into the main file and truncate it"""
+        with self.pool.writer(transaction=False) as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def optimize(self):
+        """Let SQLite refresh planner statistics where it considers them stale"""
+        with self.pool.writer(transaction=False) as conn:
+            conn.execute('PRAGMA optimize')
 
     def get_user_posts(self, username: str) -> List[Dict[str, Any]]:
         """Get all posts for a user"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT * FROM posts p
-            JOIN users u ON p.user_id = u.id
-            WHERE u.username = ?
-            ORDER BY p.timestamp DESC
-        ''', (username,))
-
-        posts = []
-        for row in cursor.fetchall():
-            post = dict(row)
-            # Get images
-            cursor.execute('SELECT * FROM images WHERE post_id = ?', (post['id'],))
-            post['images'] = [dict(r) for r in cursor.fetchall()]
-            # Get videos
-            cursor.execute('SELECT * FROM videos WHERE post_id = ?', (post['id'],))
-            post['videos'] = [dict(r) for r in cursor.fetchall()]
-            posts.append(post)
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM posts p
+                JOIN users u ON p.user_id = u.id
+                WHERE u.username = ?
+                ORDER BY p.timestamp DESC
+            ''', (username,))
+
+            posts = [dict(row) for row in cursor.fetchall()]
+            if posts:
+                ids = tuple(post['id'] for post in posts)
+                placeholders = ','.join('?' * len(ids))
+
+                images_by_post = defaultdict(list)
+                cursor.execute(f'SELECT * FROM images WHERE post_id IN ({placeholders})', ids)
+                for r in cursor.fetchall():
+                    images_by_post[r['post_id']].append(dict(r))
+
+                videos_by_post = defaultdict(list)
+                cursor.execute(f'SELECT * FROM videos WHERE post_id IN ({placeholders})', ids)
+                for r in cursor.fetchall():
+                    videos_by_post[r['post_id']].append(dict(r))
+
+                for post in posts:
+                    post['images'] = images_by_post[post['id']]
+                    post['videos'] = videos_by_post[post['id']]
 
         return posts
 
     def get_stats(self) -> Dict[str, int]:
         """Get database statistics"""
-        cursor = self.conn.cursor()
-        stats = {}
-
-        cursor.execute('SELECT COUNT(*) as count FROM users')
-        stats['total_users'] = cursor.fetchone()['count']
-
-        cursor.execute('SELECT COUNT(*) as count FROM posts')
-        stats['total_posts'] = cursor.fetchone()['count']
-
-        cursor.execute('SELECT COUNT(*) as count FROM images')
-        stats['total_images'] = cursor.fetchone()['count']
-
-        cursor.execute('SELECT COUNT(*) as count FROM videos')
-        stats['total_videos'] = cursor.fetchone()['count']
+        with self.pool.reader() as conn:
+            row = conn.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM users) AS total_users,
+                    (SELECT COUNT(*) FROM posts) AS total_posts,
+                    (SELECT COUNT(*) FROM images) AS total_images,
+                    (SELECT COUNT(*) FROM videos) AS total_videos
+            ''').fetchone()
 
-        return stats
+        return dict(row)
 
     def close(self):
-        """Close database connection"""
-        self.conn.close()
+        """Release this handle; pooled connections stay open for reuse"""
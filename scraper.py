@@ -4,21 +4,86 @@ Enhanced Instagram Posts Scraper with Collage Generation
 """
 
 import os
+import re
 import sys
-import json
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from apify_client import ApifyClient
 from database import InstagramDatabase
 from utils.image_processor import ImageProcessor
 from utils.website_scraper import WebsiteScraper
+from utils.disk_cache import DiskCache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+APIFY_ACTOR_ID = "shu8hvrXbJbY3Eb9W"
+USERNAME_PATTERN = re.compile(r'instagram\.com/([^/?#]*)')
+
+# How often a cancellable actor run checks whether it should be aborted
+ACTOR_POLL_SECONDS = 5
+
+
+@lru_cache(maxsize=1024)
+def extract_username(url: str) -> str:
+    """
+    Extract username from Instagram URL
+
+    Args:
+        url: Instagram profile URL or bare username
+
+    Returns:
+        Username string
+    """
+    url = url.strip(' \t\r\n/')
+
+    match = USERNAME_PATTERN.search(url)
+    if match:
+        return match.group(1)
+
+    # If no URL format detected, assume it's just the username
+    return url
+
+
+def _add_video_media(item, images, videos, include_views):
+    """Add a video's thumbnail and stream; view counts only exist on top-level posts"""
+    display_url = item.get("displayUrl")
+    video_url = item.get("videoUrl")
+    if display_url:
+        images.append({"url": display_url, "is_thumbnail": True, "type": "video_thumbnail"})
+    if video_url:
+        video = {"url": video_url}
+        if include_views:
+            video["viewCount"] = item.get("videoViewCount", 0)
+        videos.append(video)
+
+
+def _add_image_media(item, images, videos, include_views):
+    """Add a single image"""
+    display_url = item.get("displayUrl")
+    if display_url:
+        images.append({"url": display_url, "is_thumbnail": False, "type": "image"})
+
+
+def _add_sidecar_media(item, images, videos, include_views):
+    """Add media for each child of a carousel post"""
+    for child in item.get("childPosts", []):
+        handler = CHILD_MEDIA_HANDLERS.get(child.get("type"))
+        if handler:
+            handler(child, images, videos, False)
+
+
+CHILD_MEDIA_HANDLERS = {"Video": _add_video_media, "Image": _add_image_media}
+POST_MEDIA_HANDLERS = {**CHILD_MEDIA_HANDLERS, "Sidecar": _add_sidecar_media}
+
 
 class InstagramScraper:
-    def __init__(self, api_token, use_database=True, db_path="instagram_data.db"):
+    def __init__(self, api_token, use_database=True, db_path="instagram_data.db", profile_ttl=3600,
+                 cache_ttl=3600, pretty_json=False):
         """
         Initialize the scraper with Apify API token
 
@@ -26,12 +91,18 @@ class InstagramScraper:
             api_token: Apify API token
             use_database: Whether to use database storage (default: True)
             db_path: Path to SQLite database file
+            profile_ttl: Seconds a stored profile is reused instead of re-fetched (default: 3600)
+            cache_ttl: Seconds raw actor results are cached on disk (default: 3600, 0 disables)
+            pretty_json: Indent posts_data.json instead of streaming it compactly (default: False)
         """
         self.client = ApifyClient(api_token)
         self.output_dir = "output"
         self.images_dir = os.path.join(self.output_dir, "images")
         self.data_file = os.path.join(self.output_dir, "posts_data.json")
         self.use_database = use_database
+        self.profile_ttl = profile_ttl
+        self.pretty_json = pretty_json
+        self.cache = DiskCache(os.path.join(self.output_dir, ".apify_cache"), ttl_seconds=cache_ttl)
         self.db = None
 
         # Initialize image processor
@@ -48,34 +119,64 @@ class InstagramScraper:
             self.db = InstagramDatabase(db_path)
             print(f"Database storage enabled: {db_path}")
 
-    def extract_username_from_url(self, url: str) -> str:
+    @staticmethod
+    def extract_username_from_url(url: str) -> str:
+        """Extract username from Instagram URL (see extract_username)"""
+        return extract_username(url)
+
+    def run_actor(self, run_input: dict, force_refresh: bool = False,
+                  cancel: threading.Event = None):
         """
-        Extract username from Instagram URL
+        Run the Instagram actor and return its dataset items, using the disk cache
 
         Args:
-            url: Instagram profile URL
+            run_input: Actor input; its resultsLimit bounds how many items are read
+            force_refresh: Skip the cache and always run the actor
+            cancel: When set while the actor runs, the run is aborted on Apify
+                (so it stops billing) and no items are returned
 
         Returns:
-            Username string
+            List of dataset items
         """
-        # Handle various Instagram URL formats
-        url = url.strip().rstrip('/')
-
-        if 'instagram.com/' in url:
-            parts = url.split('instagram.com/')
-            if len(parts) > 1:
-                username = parts[1].split('/')[0].split('?')[0]
-                return username
-
-        # If no URL format detected, assume it's just the username
-        return url
+        key = self.cache.make_key(APIFY_ACTOR_ID, run_input)
+        if not force_refresh:
+            items = self.cache.get(key)
+            if items is not None:
+                print("✓ Using cached actor results")
+                return items
+
+        if cancel is None:
+            run = self.client.actor(APIFY_ACTOR_ID).call(run_input=run_input)
+        else:
+            run = self.client.actor(APIFY_ACTOR_ID).start(run_input=run_input)
+            run_client = self.client.run(run["id"])
+            while run["status"] in ("READY", "RUNNING"):
+                if cancel.is_set():
+                    print("Aborting actor run that is no longer needed...")
+                    run_client.abort()
+                    return []
+                run = run_client.wait_for_finish(wait_secs=ACTOR_POLL_SECONDS) or run
+
+        # One page of exactly resultsLimit items instead of paginating the whole dataset
+        dataset = self.client.dataset(run["defaultDatasetId"])
+        limit = run_input.get("resultsLimit")
+        if limit:
+            items = dataset.list_items(limit=limit).items
+        else:
+            items = list(dataset.iterate_items())
+
+        # Empty results are usually transient; don't pin them for the TTL
+        if items:
+            self.cache.set(key, items)
+        return items
 
-    def fetch_user_profile(self, username: str):
+    def fetch_user_profile(self, username: str, force_refresh: bool = False):
         """
         Fetch user profile information
 
         Args:
             username: Instagram username
+            force_refresh: Bypass the actor result cache
 
         Returns:
             Profile data
@@ -90,10 +191,8 @@ class InstagramScraper:
             "addParentData": True,
         }
 
-        run = self.client.actor("shu8hvrXbJbY3Eb9W").call(run_input=run_input)
-
         # Get first item to extract profile data
-        items = list(self.client.dataset(run["defaultDatasetId"]).iterate_items())
+        items = self.run_actor(run_input, force_refresh)
 
         if items:
             item = items[0]
@@ -115,10 +214,12 @@ class InstagramScraper:
                 'profile_pic_url': profile_pic_url,
                 'bio': item.get('bio', '') or item.get('biography', ''),
                 'website': item.get('externalUrl', '') or item.get('website', ''),
-                'ownerId': item.get('ownerId', '') or item.get('id', ''),
+                # items[0] is a post, so its 'id' is a post id, never the user's
+                'ownerId': item.get('ownerId', ''),
                 'followers': item.get('followersCount', 0),
                 'following': item.get('followsCount', 0),
-                'is_verified': item.get('verified', False)
+                'is_verified': item.get('verified', False),
+                'is_private': item.get('private', False)
             }
 
             print(f"✓ Profile fetched: {full_name} (@{username})")
@@ -130,13 +231,33 @@ class InstagramScraper:
         print(f"✗ No profile data found for @{username}")
         return None
 
-    def fetch_user_posts(self, username, results_limit=30):
+    def get_profile(self, username: str, force_refresh: bool = False):
+        """
+        Return profile information, reusing a recently stored profile to skip an actor run
+
+        Args:
+            username: Instagram username
+            force_refresh: Ignore stored and cached profiles
+
+        Returns:
+            Profile data or None
+        """
+        if self.db and not force_refresh:
+            profile_info = self.db.get_user_fresh(username, ttl=self.profile_ttl)
+            if profile_info:
+                print(f"✓ Using stored profile for @{username}")
+                return profile_info
+        return self.fetch_user_profile(username, force_refresh)
+
+    def fetch_user_posts(self, username, results_limit=30, force_refresh=False, cancel=None):
         """
         Fetch posts from an Instagram user profile
 
         Args:
             username: Instagram username
             results_limit: Number of posts to fetch (default: 30)
+            force_refresh: Bypass the actor result cache
+            cancel: Optional threading.Event that aborts the actor run once set
 
         Returns:
             List of post data
@@ -153,15 +274,9 @@ class InstagramScraper:
             "addParentData": True,
         }
 
-        # Run the Actor
+        # Run the Actor and fetch results
         print("Running Apify actor...")
-        run = self.client.actor("shu8hvrXbJbY3Eb9W").call(run_input=run_input)
-
-        # Fetch results
-        print("Fetching results...")
-        posts = []
-        for item in self.client.dataset(run["defaultDatasetId"]).iterate_items():
-            posts.append(item)
+        posts = self.run_actor(run_input, force_refresh, cancel)
 
         print(f"Successfully fetched {len(posts)} posts")
         return posts
@@ -176,89 +291,57 @@ class InstagramScraper:
         Returns:
             List of processed post data
         """
-        processed_posts = []
-
-        for idx, post in enumerate(posts):
-            # Extract profile avatar URL
-            profile_pic_url = post.get("profilePicUrlHD") or post.get("profilePicUrl") or post.get("ownerProfilePicUrl", "")
-
-            processed_post = {
-                "id": post.get("id"),
-                "shortCode": post.get("shortCode"),
-                "type": post.get("type"),
-                "caption": post.get("caption", ""),
-                "timestamp": post.get("timestamp"),
-                "likesCount": post.get("likesCount", 0),
-                "commentsCount": post.get("commentsCount", 0),
-                "videoViewCount": post.get("videoViewCount", 0),
-                "url": post.get("url"),
-                "ownerFullName": post.get("ownerFullName", ""),
-                "ownerUsername": post.get("ownerUsername", ""),
-                "ownerId": post.get("ownerId", ""),
-                "ownerProfilePicUrl": profile_pic_url,
-                "images": [],
-                "videos": []
+        return list(self.iter_processed_posts(posts))
+
+    def iter_processed_posts(self, posts):
+        """
+        Yield processed posts one at a time (see process_posts)
+
+        Args:
+            posts: Iterable of raw post data from API
+        """
+        for post in posts:
+            get = post.get
+            post_type = get("type")
+
+            # Collect media for the post type; unknown types get no media
+            images, videos = [], []
+            handler = POST_MEDIA_HANDLERS.get(post_type)
+            if handler:
+                handler(post, images, videos, True)
+
+            yield {
+                "id": get("id"),
+                "shortCode": get("shortCode"),
+                "type": post_type,
+                "caption": get("caption", ""),
+                "timestamp": get("timestamp"),
+                "likesCount": get("likesCount", 0),
+                "commentsCount": get("commentsCount", 0),
+                "videoViewCount": get("videoViewCount", 0),
+                "url": get("url"),
+                "ownerFullName": get("ownerFullName", ""),
+                "ownerUsername": get("ownerUsername", ""),
+                "ownerId": get("ownerId", ""),
+                # Extract profile avatar URL
+                "ownerProfilePicUrl": get("profilePicUrlHD") or get("profilePicUrl") or get("ownerProfilePicUrl", ""),
+                "images": images,
+                "videos": videos
             }
 
-            # Handle different post types
-            if post.get("type") == "Video":
-                if post.get("displayUrl"):
-                    processed_post["images"].append({
-                        "url": post.get("displayUrl"),
-                        "is_thumbnail": True,
-                        "type": "video_thumbnail"
-                    })
-                if post.get("videoUrl"):
-                    processed_post["videos"].append({
-                        "url": post.get("videoUrl"),
-                        "viewCount": post.get("videoViewCount", 0)
-                    })
-
-            elif post.get("type") == "Image":
-                if post.get("displayUrl"):
-                    processed_post["images"].append({
-                        "url": post.get("displayUrl"),
-                        "is_thumbnail": False,
-                        "type": "image"
-                    })
-
-            elif post.get("type") == "Sidecar":
-                for child in post.get("childPosts", []):
-                    if child.get("type") == "Video":
-                        if child.get("displayUrl"):
-                            processed_post["images"].append({
-                                "url": child.get("displayUrl"),
-                                "is_thumbnail": True,
-                                "type": "video_thumbnail"
-                            })
-                        if child.get("videoUrl"):
-                            processed_post["videos"].append({
-                                "url": child.get("videoUrl")
-                            })
-                    elif child.get("type") == "Image":
-                        if child.get("displayUrl"):
-                            processed_post["images"].append({
-                                "url": child.get("displayUrl"),
-                                "is_thumbnail": False,
-                                "type": "image"
-                            })
-
-            processed_posts.append(processed_post)
-
-        return processed_posts
-
-    def generate_collages(self, posts):
+    def generate_collages(self, posts, on_collage=None):
         """
         Generate image collages for all posts using parallel processing
 
         Args:
-            posts: List of processed posts
+            posts: Processed posts (list or generator)
+            on_collage: Optional callback invoked with each collage path as it is saved
 
         Returns:
             Updated posts with collage paths
         """
         # Use parallel processing for faster collage generation
-        return self.image_processor.generate_collages_parallel(posts)
+        return self.image_processor.generate_collages_parallel(posts, on_complete=on_collage)
 
     def scrape_personal_website(self, profile_info):
         """
@@ -302,32 +385,56 @@ class InstagramScraper:
             "posts": posts
         }
 
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        with open(self.data_file, 'wb') as f:
+            if self.pretty_json:
+                f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                self._write_posts_json(f, output_data)
 
         print(f"Data saved to JSON: {self.data_file}")
 
         # Save to database if enabled
         if self.use_database and self.db:
             print("Saving data to database...")
-            stats = self.db.save_posts_batch(username, posts)
+            # Posts, media, profile and the session log share one commit
+            with self.db.transaction():
+                stats = self.db.save_posts_batch(username, posts, profile_info)
+                self.db.log_scraping_session(
+                    username=username,
+                    posts_fetched=len(posts),
+                    status="success",
+                    started_at=datetime.now()
+                )
             print(f"Database stats: {stats}")
-
-            self.db.log_scraping_session(
-                username=username,
-                posts_fetched=len(posts),
-                status="success",
-                started_at=datetime.now()
-            )
             print("Database save complete!")
 
-    def scrape_profile(self, profile_url: str, results_limit: int = 10):
+    @staticmethod
+    def _write_posts_json(f, output_data):
+        """
+        Write output_data compactly to a binary file, encoding one post at a time
+
+        Same document as orjson.dumps(output_data), but the posts list is never
+        materialized as one big buffer.
+        """
+        header = {key: value for key, value in output_data.items() if key != "posts"}
+        f.write(orjson.dumps(header, option=orjson.OPT_NON_STR_KEYS)[:-1])
+        f.write(b',"posts":[')
+        for idx, post in enumerate(output_data["posts"]):
+            if idx:
+                f.write(b',')
+            f.write(orjson.dumps(post, option=orjson.OPT_NON_STR_KEYS))
+        f.write(b']}')
+
+    def scrape_profile(self, profile_url: str, results_limit: int = 10, force_refresh: bool = False,
+                       on_collage=None):
         """
         Main method to scrape entire profile with parallel processing
 
         Args:
             profile_url: Instagram profile URL or username
             results_limit: Number of posts to fetch (default: 10)
+            force_refresh: Re-run the actors instead of using stored or cached results
+            on_collage: Optional callback invoked with each collage path as it is saved
 
         Returns:
             Complete profile data with analysis
@@ -338,26 +445,42 @@ class InstagramScraper:
         print(f"Starting profile scrape for: @{username}")
         print(f"{'='*60}\n")
 
-        # Fetch profile info
-        profile_info = self.fetch_user_profile(username)
-        if not profile_info:
-            print(f"Error: Could not fetch profile for @{username}")
-            return None
-
-        # Fetch posts
-        raw_posts = self.fetch_user_posts(username, results_limit)
-        if not raw_posts:
-            print(f"Error: No posts found for @{username}")
-            return None
-
-        # Process posts
-        processed_posts = self.process_posts(raw_posts)
-
-        # Generate collages
-        processed_posts = self.generate_collages(processed_posts)
-
-        # Scrape personal website if available
-        website_data = self.scrape_personal_website(profile_info)
+        # Fetch profile info and posts concurrently; the two actor runs are independent.
+        # The website scrape starts as soon as the profile is known and overlaps the
+        # posts fetch and collage generation.
+        # The executor is shut down explicitly: leaving a with block would wait
+        # for the posts actor even when the profile lookup already failed.
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='scrape')
+        cancel_posts = threading.Event()
+        try:
+            profile_future = executor.submit(self.get_profile, username, force_refresh)
+            posts_future = executor.submit(self.fetch_user_posts, username, results_limit,
+                                           force_refresh, cancel_posts)
+
+            profile_info = profile_future.result()
+            if not profile_info:
+                print(f"Error: Could not fetch profile for @{username}")
+                # Aborts the posts actor run if it already started
+                cancel_posts.set()
+                posts_future.cancel()
+                return None
+            website_future = executor.submit(self.scrape_personal_website, profile_info)
+
+            raw_posts = posts_future.result()
+            if not raw_posts:
+                print(f"Error: No posts found for @{username}")
+                website_future.cancel()
+                return None
+
+            # Process posts and generate collages; each post starts collaging as soon as it is processed
+            processed_posts = self.generate_collages(self.iter_processed_posts(raw_posts), on_collage)
+
+            website_data = website_future.result()
+        except BaseException:
+            cancel_posts.set()
+            raise
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
         # Save all data
         self.save_data(processed_posts, username, profile_info, website_data)
@@ -37,7 +37,9 @@ document.getElementById('analyze-form').addEventListener('submit', async (e) =>
         });
 
         if (!response.ok) {
-            throw new Error('Failed to start analysis');
+            // Error bodies from a proxy (502) or an HTML error page aren't JSON
+            const body = await response.json().catch(() => ({}));
+            throw new Error(body.error || response.statusText || 'Failed to start analysis');
         }
 
         const data = await response.json();
@@ -52,7 +54,7 @@ document.getElementById('analyze-form').addEventListener('submit', async (e) =>
 
     } catch (error) {
         console.error('Error:', error);
-        alert('Failed to start analysis. Please try again.');
+        alert(`${error.message}. Please try again.`);
     }
 });
 
@@ -2,121 +2,61 @@
 AI-powered profile analyzer using Google Gemini API
 """
 
+import asyncio
+import io
+import mimetypes
 import os
-import json
+import re
+import threading
+import time
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from typing import Dict, List, Any
 from PIL import Image
+from utils.disk_cache import DiskCache
 
+# Longest edge sent to the model; larger collages are downscaled once and cached.
+# Gemini bills images per 768px tile, so a 1200x1350 collage costs ~4x more than
+# the same collage bounded to one tile, with no gain for this analysis.
+MAX_IMAGE_EDGE = 768
 
-class ProfileAnalyzer:
-    def __init__(self, api_key: str):
-        """Initialize analyzer with Google API key"""
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-
-    def analyze_profile(self, posts_data: List[Dict], profile_info: Dict,
-                       website_data: Dict = None, collage_paths: List[str] = None) -> Dict[str, Any]:
-        """
-        Analyze Instagram profile and generate comprehensive report
-
-        Args:
-            posts_data: List of post data
-            profile_info: Profile information
-            website_data: Scraped website data (optional)
-            collage_paths: List of image collage file paths (optional)
+# A reply wrapped in a markdown code fence, with or without a json tag
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.DOTALL)
 
-        Returns:
-            Complete analysis report
-        """
-        print("Starting AI-powered profile analysis with Gemini 2.5 Flash...")
+# Collages sent with one analysis; prefetching stops at the same count
+MAX_COLLAGES = 10
 
-        # Prepare analysis prompt
-        prompt = self._build_analysis_prompt(posts_data, profile_info, website_data)
+# Uploaded files expire after 48 hours; stop reusing them a little earlier
+FILE_API_TTL = 47 * 3600
 
-        # Prepare images for vision analysis
-        content_parts = [prompt]
-
-        if collage_paths:
-            print(f"Loading {len(collage_paths)} post images for visual analysis...")
-            # Load all collage images
-            for idx, path in enumerate(collage_paths[:10], 1):  # Limit to 10 images
-                if os.path.exists(path):
-                    try:
-                        img = Image.open(path)
-                        content_parts.append(img)
-                        print(f"  ✓ Loaded image {idx}: {os.path.basename(path)}")
-                    except Exception as e:
-                        print(f"  ✗ Error loading image {path}: {e}")
-
-        try:
-            print(f"Sending request to Gemini with {len(content_parts)} parts (1 text + {len(content_parts)-1} images)...")
-
-            # Generate content with Gemini
-            response = self.model.generate_content(
-                content_parts,
-                generation_config={
-                    'temperature': 0.7,
-                    'max_output_tokens': 8192,
-                }
-            )
-
-            # Parse response
-            analysis_text = response.text
-            analysis = self._parse_analysis_response(analysis_text, posts_data)
-
-            print(f"✓ Analysis complete using Gemini 2.5 Flash!")
-            return analysis
-
-        except Exception as e:
-            print(f"Error during AI analysis: {e}")
-            print(f"Using fallback analysis...")
-            return self._generate_fallback_analysis(posts_data, profile_info)
-
-    def _build_analysis_prompt(self, posts_data: List[Dict], profile_info: Dict,
-                              website_data: Dict = None) -> str:
-        """Build comprehensive analysis prompt"""
-
-        # Gather post information
-        captions = []
-        post_stats = []
-
-        for idx, post in enumerate(posts_data[:30], 1):  # Limit to 30 posts
-            caption = post.get('caption', '')
-            likes = post.get('likesCount', 0)
-            comments = post.get('commentsCount', 0)
-            post_type = post.get('type', '')
-
-            captions.append(f"Post {idx} ({post_type}): {caption}")
-            post_stats.append(f"Post {idx}: {likes} likes, {comments} comments")
-
-        # Build prompt
-        prompt = f"""You are an expert social media analyst with advanced visual analysis capabilities. Analyze this Instagram profile using BOTH the text information provided AND the visual content in the images.
+# Analysis prompt, split so only the profile-specific parts are formatted per call;
+# the instructions contain the literal JSON schema and are appended as-is
+_PROMPT_HEAD = """You are an expert social media analyst with advanced visual analysis capabilities. Analyze this Instagram profile using BOTH the text information provided AND the visual content in the images.
 
 PROFILE INFORMATION:
-Username: {profile_info.get('username', 'N/A')}
-Full Name: {profile_info.get('full_name', 'N/A')}
-Bio: {profile_info.get('bio', 'N/A')}
-Website: {profile_info.get('website', 'N/A')}
+Username: {username}
+Full Name: {full_name}
+Bio: {bio}
+Website: {website}
 
 POST CAPTIONS AND CONTENT:
-{chr(10).join(captions[:20])}
+{captions}
 
 POST ENGAGEMENT:
-{chr(10).join(post_stats[:10])}
+{post_stats}
 """
 
-        if website_data and not website_data.get('error'):
-            prompt += f"""
+_WEBSITE_SECTION = """
 
 PERSONAL WEBSITE DATA:
-Website: {website_data.get('url', '')}
-Title: {website_data.get('title', '')}
-Description: {website_data.get('description', '')}
-Content Preview: {website_data.get('text_content', '')[:1000]}
+Website: {url}
+Title: {title}
+Description: {description}
+Content Preview: {text_preview}
 """
 
-        prompt += """
+_PROMPT_INSTRUCTIONS = """
 
 VISUAL ANALYSIS INSTRUCTIONS:
 I'm providing you with images of their Instagram posts. Please analyze:
@@ -170,45 +110,492 @@ IMPORTANT:
 - Return ONLY valid JSON without any additional text or markdown formatting
 """
 
-        return prompt
+# Shared by the sync and async requests
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'max_output_tokens': 8192,
+    # JSON mode: the reply is a bare JSON object, no markdown fences
+    'response_mime_type': 'application/json',
+}
+
+
+class _JsonStreamCollector:
+    """
+    Accumulate streamed text until the top-level JSON object closes
+
+    Braces are counted outside string literals, so the stream can be left
+    as soon as the object is complete; if it never balances, text holds the
+    full reply for the parser to reject.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = self._escaped = self._started = False
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def add(self, chunk) -> bool:
+        """Append one response chunk; True once the object is complete"""
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunk without text parts (e.g. a finish/safety notice)
+            return False
+
+        for pos, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+                self._started = True
+            elif char == '}':
+                self._depth -= 1
+                if self._started and self._depth == 0:
+                    self._parts.append(text[:pos + 1])
+                    return True
+
+        self._parts.append(text)
+        return False
+
+
+class ProfileAnalyzer:
+    def __init__(self, api_key: str, cache_dir: str = "output/.analysis_cache", cache_ttl: int = 3600,
+                 use_file_api: bool = True):
+        """
+        Initialize analyzer with Google API key
+
+        Args:
+            api_key: Google Gemini API key
+            cache_dir: Directory for cached analyses
+            cache_ttl: Seconds an identical analysis is reused (default: 3600, 0 disables)
+            use_file_api: Upload each collage once and reference it by URI instead of
+                sending its bytes with every request (default: True)
+        """
+        genai.configure(api_key=api_key)
+        self.model_name = 'gemini-2.0-flash-exp'
+        self.model = genai.GenerativeModel(self.model_name)
+        self.cache = DiskCache(cache_dir, ttl_seconds=cache_ttl)
+        self.use_file_api = use_file_api
+
+        # Collages read ahead of analyze_profile (see prefetch_collage)
+        self._prefetched = {}
+        self._prefetch_pool = None
+        self._prefetch_lock = threading.Lock()
+
+    def prefetch_collage(self, path: str):
+        """
+        Start reading a collage in the background as soon as it is saved
+
+        Pass this as the scraper's on_collage callback so image preparation
+        overlaps collage generation; analyze_profile picks up the results.
+        Only the first MAX_COLLAGES are read, since no more are sent. Collages
+        can finish out of post order, so one outside the first MAX_COLLAGES may
+        take a slot; _prepare_request loads any it then misses itself.
+        """
+        with self._prefetch_lock:
+            if path in self._prefetched or len(self._prefetched) >= MAX_COLLAGES:
+                return
+            if self._prefetch_pool is None:
+                self._prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='collage-prefetch')
+            self._prefetched[path] = self._prefetch_pool.submit(self._load_collage, path)
+
+    def _take_prefetched(self) -> Dict[str, Any]:
+        """Hand over prefetched collages and release the prefetch pool"""
+        with self._prefetch_lock:
+            prefetched, self._prefetched = self._prefetched, {}
+            pool, self._prefetch_pool = self._prefetch_pool, None
+        if pool:
+            pool.shutdown(wait=False)
+        return prefetched
+
+    def analyze_profile(self, posts_data: List[Dict], profile_info: Dict,
+                       website_data: Dict = None, collage_paths: List[str] = None,
+                       force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Analyze Instagram profile and generate comprehensive report
+
+        Args:
+            posts_data: List of post data
+            profile_info: Profile information
+            website_data: Scraped website data (optional)
+            collage_paths: List of image collage file paths (optional)
+            force_refresh: Call Gemini even if an identical analysis is cached
+
+        Returns:
+            Complete analysis report
+        """
+        print("Starting AI-powered profile analysis with Gemini 2.5 Flash...")
+
+        cache_key, cached, content_parts = self._prepare_request(
+            posts_data, profile_info, website_data, collage_paths, force_refresh
+        )
+        if cached is not None:
+            return cached
+
+        try:
+            print(f"Sending request to Gemini with {len(content_parts)} parts (1 text + {len(content_parts)-1} images)...")
+
+            # Generate content with Gemini
+            response = self.model.generate_content(
+                content_parts,
+                generation_config=GENERATION_CONFIG,
+                stream=True
+            )
+
+            # Parse response as soon as the outer JSON object is complete
+            collector = _JsonStreamCollector()
+            for chunk in response:
+                if collector.add(chunk):
+                    break
+            return self._finish_analysis(cache_key, collector.text, posts_data)
+
+        except Exception as e:
+            print(f"Error during AI analysis: {e}")
+            print(f"Using fallback analysis...")
+            return self._generate_fallback_analysis(posts_data, profile_info)
+
+    async def analyze_profile_async(self, posts_data: List[Dict], profile_info: Dict,
+                                    website_data: Dict = None, collage_paths: List[str] = None,
+                                    force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Coroutine version of analyze_profile
+
+        Collage loading runs in the event loop's default executor; the Gemini
+        request itself is awaited, so many analyses can wait on the model from
+        a single thread. Arguments and result are the same as analyze_profile.
+        """
+        print("Starting AI-powered profile analysis with Gemini 2.5 Flash...")
+
+        loop = asyncio.get_running_loop()
+        cache_key, cached, content_parts = await loop.run_in_executor(
+            None, self._prepare_request,
+            posts_data, profile_info, website_data, collage_paths, force_refresh
+        )
+        if cached is not None:
+            return cached
+
+        try:
+            print(f"Sending request to Gemini with {len(content_parts)} parts (1 text + {len(content_parts)-1} images)...")
+
+            response = await self.model.generate_content_async(
+                content_parts,
+                generation_config=GENERATION_CONFIG,
+                stream=True
+            )
+
+            collector = _JsonStreamCollector()
+            async for chunk in response:
+                if collector.add(chunk):
+                    break
+            return self._finish_analysis(cache_key, collector.text, posts_data)
+
+        except Exception as e:
+            print(f"Error during AI analysis: {e}")
+            print(f"Using fallback analysis...")
+            return self._generate_fallback_analysis(posts_data, profile_info)
+
+    def _prepare_request(self, posts_data: List[Dict], profile_info: Dict, website_data: Dict,
+                         collage_paths: List[str], force_refresh: bool):
+        """
+        Build the prompt and image parts for one analysis
+
+        Returns:
+            (cache_key, cached analysis or None, content parts or None when cached)
+        """
+        prefetched = self._take_prefetched()
+
+        # Prepare analysis prompt
+        prompt = self._build_analysis_prompt(posts_data, profile_info, website_data)
+
+        # Collage filenames carry a content hash, so prompt + paths identify the request
+        cache_key = self.cache.make_key(self.model_name, prompt, (collage_paths or [])[:MAX_COLLAGES])
+        if not force_refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("✓ Using cached analysis")
+                return cache_key, cached, None
+
+        # Prepare images for vision analysis
+        content_parts = [prompt]
+
+        if collage_paths:
+            print(f"Loading {len(collage_paths)} post images for visual analysis...")
+            # Limit to MAX_COLLAGES images; skip missing or empty files before reading
+            paths = self._existing_collages(collage_paths[:MAX_COLLAGES])
+            if paths:
+                def load(idx, path):
+                    future = prefetched.get(path)
+                    return future.result() if future else self._load_collage(path, idx)
+
+                # Read collages not prefetched concurrently; map keeps them in post order
+                with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+                    images = executor.map(load, range(1, len(paths) + 1), paths)
+                    content_parts.extend(img for img in images if img is not None)
+
+        return cache_key, None, content_parts
+
+    def _finish_analysis(self, cache_key: str, analysis_text: str, posts_data: List[Dict]) -> Dict[str, Any]:
+        """Parse a complete reply and cache it (raises ValueError if it isn't JSON)"""
+        analysis = self._parse_analysis_response(analysis_text, posts_data)
+        self.cache.set(cache_key, analysis)
+
+        print(f"✓ Analysis complete using Gemini 2.5 Flash!")
+        return analysis
+
+    def analyze_profiles_batch(self, profiles: List[Dict[str, Any]], max_workers: int = 4,
+                               force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Analyze several profiles, running up to max_workers Gemini requests at once
+
+        Args:
+            profiles: Dicts with the analyze_profile arguments: posts_data,
+                profile_info and optionally website_data and collage_paths
+            max_workers: Concurrent requests (keep within the Gemini RPM quota)
+            force_refresh: Call Gemini even for analyses that are cached
+
+        Returns:
+            One analysis per profile, in input order
+        """
+        def analyze(profile):
+            return self.analyze_profile(
+                profile['posts_data'],
+                profile['profile_info'],
+                profile.get('website_data'),
+                profile.get('collage_paths'),
+                force_refresh=force_refresh
+            )
+
+        if not profiles:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(profiles))) as executor:
+            return list(executor.map(analyze, profiles))
+
+    async def analyze_profiles_async(self, profiles: List[Dict[str, Any]], max_concurrency: int = 5,
+                                     force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Coroutine version of analyze_profiles_batch
+
+        Args:
+            profiles: Dicts with the analyze_profile arguments (see analyze_profiles_batch)
+            max_concurrency: Requests in flight at once (keep within the Gemini RPM quota)
+            force_refresh: Call Gemini even for analyses that are cached
+
+        Returns:
+            One analysis per profile, in input order
+        """
+        slots = asyncio.Semaphore(max_concurrency)
+
+        async def analyze(profile):
+            async with slots:
+                return await self.analyze_profile_async(
+                    profile['posts_data'],
+                    profile['profile_info'],
+                    profile.get('website_data'),
+                    profile.get('collage_paths'),
+                    force_refresh=force_refresh
+                )
+
+        return list(await asyncio.gather(*(analyze(profile) for profile in profiles)))
+
+    @staticmethod
+    def _existing_collages(paths: List[str]) -> List[str]:
+        """
+        Keep the paths that are non-empty files, listing each directory once
+
+        Collages normally share one directory, so this is a single scandir
+        instead of a stat per path.
+        """
+        wanted = {}
+        for path in paths:
+            directory, name = os.path.split(path)
+            wanted.setdefault(directory, set()).add(name)
+
+        existing = set()
+        for directory, names in wanted.items():
+            try:
+                with os.scandir(directory or '.') as entries:
+                    for entry in entries:
+                        if entry.name in names and entry.is_file() and entry.stat().st_size > 0:
+                            existing.add(os.path.join(directory, entry.name))
+            except OSError:
+                continue
+
+        return [path for path in paths if path in existing]
+
+    def _load_collage(self, path: str, idx: int = None):
+        """
+        Prepare one collage as an image part, or return None if it can't be read
+
+        With the Files API enabled, a collage uploaded within FILE_API_TTL is
+        referenced by its URI (recorded in a `.gemini-<edge>.json` sidecar) without
+        reading the image at all; otherwise it is uploaded once, falling back
+        to inline bytes if the upload fails.
+        """
+        stem = os.path.splitext(path)[0]
+        try:
+            part = self._uploaded_part(stem) if self.use_file_api else None
+            if part is None:
+                data, mime_type = self._read_collage(path, stem)
+                part = {'mime_type': mime_type, 'data': data}
+                if self.use_file_api:
+                    part = self._upload_collage(stem, data, mime_type) or part
+
+            if idx:
+                print(f"  ✓ Loaded image {idx}: {os.path.basename(path)}")
+            else:
+                print(f"  ✓ Prefetched image: {os.path.basename(path)}")
+            return part
+        except Exception as e:
+            print(f"  ✗ Error loading image {path}: {e}")
+            return None
+
+    @staticmethod
+    def _read_collage(path: str, stem: str):
+        """
+        Return (bytes, mime type) for a collage, bounded to MAX_IMAGE_EDGE
+
+        Collages within the bound are returned as their original bytes. Larger
+        ones are downscaled to a `.small-<edge>.jpg` sidecar on first use; collage
+        names carry a content hash, so the sidecar never goes stale.
+        """
+        small_path = f"{stem}.small-{MAX_IMAGE_EDGE}.jpg"
+        try:
+            with open(small_path, 'rb') as f:
+                return f.read(), 'image/jpeg'
+        except FileNotFoundError:
+            pass
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        # Image.open only parses the header here; pixels are decoded only if resizing
+        with Image.open(io.BytesIO(data)) as img:
+            if max(img.size) <= MAX_IMAGE_EDGE:
+                return data, mimetypes.guess_type(path)[0] or 'image/jpeg'
+
+            # Let libjpeg decode at a reduced scale before the final resample
+            img.draft('RGB', (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE))
+            img.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.LANCZOS)
+            buffer = io.BytesIO()
+            img.convert('RGB').save(buffer, format='JPEG', quality=85, optimize=True)
+
+        data = buffer.getvalue()
+        # pid too: collage worker processes share the directory, and thread idents repeat across processes
+        tmp_path = f"{small_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, small_path)
+        return data, 'image/jpeg'
+
+    @staticmethod
+    def _uploaded_part(stem: str):
+        """Return a file reference part for a recent upload of this collage, if any"""
+        try:
+            with open(f"{stem}.gemini-{MAX_IMAGE_EDGE}.json", 'rb') as f:
+                uploaded = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+        if time.time() - uploaded.get('uploaded_at', 0) > FILE_API_TTL:
+            return None
+        return {'file_data': {'mime_type': uploaded['mime_type'], 'file_uri': uploaded['uri']}}
+
+    @staticmethod
+    def _upload_collage(stem: str, data: bytes, mime_type: str):
+        """Upload a collage to the Files API and record its URI; None on failure"""
+        try:
+            uploaded = genai.upload_file(io.BytesIO(data), mime_type=mime_type)
+        except Exception as e:
+            print(f"  ✗ File upload failed, sending inline: {e}")
+            return None
+
+        record = {'uri': uploaded.uri, 'mime_type': mime_type, 'uploaded_at': time.time()}
+        # Replaced atomically, so a crash or a concurrent _uploaded_part never sees a partial record
+        record_path = f"{stem}.gemini-{MAX_IMAGE_EDGE}.json"
+        tmp_path = f"{record_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(record))
+        os.replace(tmp_path, record_path)
+        return {'file_data': {'mime_type': mime_type, 'file_uri': uploaded.uri}}
+
+    def _build_analysis_prompt(self, posts_data: List[Dict], profile_info: Dict,
+                              website_data: Dict = None) -> str:
+        """Build comprehensive analysis prompt"""
+
+        # Gather post information (only the first 20 captions and 10 stats are used)
+        captions = "\n".join(
+            f"Post {idx} ({post.get('type', '')}): {post.get('caption', '')}"
+            for idx, post in enumerate(posts_data[:20], 1)
+        )
+        post_stats = "\n".join(
+            f"Post {idx}: {post.get('likesCount', 0)} likes, {post.get('commentsCount', 0)} comments"
+            for idx, post in enumerate(posts_data[:10], 1)
+        )
+
+        prompt = _PROMPT_HEAD.format_map({
+            'username': profile_info.get('username', 'N/A'),
+            'full_name': profile_info.get('full_name', 'N/A'),
+            'bio': profile_info.get('bio', 'N/A'),
+            'website': profile_info.get('website', 'N/A'),
+            'captions': captions,
+            'post_stats': post_stats,
+        })
+
+        website_section = ''
+        if website_data and not website_data.get('error'):
+            website_section = _WEBSITE_SECTION.format_map({
+                'url': website_data.get('url', ''),
+                'title': website_data.get('title', ''),
+                'description': website_data.get('description', ''),
+                'text_preview': website_data.get('text_content', '')[:1000],
+            })
+
+        return prompt + website_section + _PROMPT_INSTRUCTIONS
+
+    @staticmethod
+    def _posts_to_collage_entries(posts_data: List[Dict]) -> List[Dict[str, Any]]:
+        """Summaries of the posts as listed in posts_with_collages"""
+        return [
+            {
+                'post_number': idx,
+                'type': post.get('type', ''),
+                'caption': post.get('caption', ''),
+                'likes': post.get('likesCount', 0),
+                'comments': post.get('commentsCount', 0),
+                'url': post.get('url', ''),
+                'collage_path': post.get('collage_path', ''),
+                'timestamp': post.get('timestamp', '')
+            }
+            for idx, post in enumerate(posts_data, 1)
+        ]
 
     def _parse_analysis_response(self, response_text: str, posts_data: List[Dict]) -> Dict[str, Any]:
-        """Parse Gemini's response into structured format"""
+        """Parse Gemini's JSON-mode response into structured format"""
         try:
-            # Try to extract JSON from response
-            # Remove markdown code blocks if present
-            response_text = response_text.strip()
-            if response_text.startswith('```'):
-                lines = response_text.split('\n')
-                response_text = '\n'.join(lines[1:-1])
-            if response_text.startswith('```json'):
-                response_text = response_text[7:]
-            if response_text.endswith('```'):
-                response_text = response_text[:-3]
-
-            analysis = json.loads(response_text.strip())
+            # JSON mode replies are bare objects; still accept a fenced reply
+            match = _FENCE_RE.match(response_text)
+            analysis = orjson.loads(match.group(1) if match else response_text)
 
             # Add post collages to the analysis
-            analysis['posts_with_collages'] = []
-            for idx, post in enumerate(posts_data):
-                post_entry = {
-                    'post_number': idx + 1,
-                    'type': post.get('type', ''),
-                    'caption': post.get('caption', ''),
-                    'likes': post.get('likesCount', 0),
-                    'comments': post.get('commentsCount', 0),
-                    'url': post.get('url', ''),
-                    'collage_path': post.get('collage_path', ''),
-                    'timestamp': post.get('timestamp', '')
-                }
-                analysis['posts_with_collages'].append(post_entry)
+            analysis['posts_with_collages'] = self._posts_to_collage_entries(posts_data)
 
             return analysis
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             print(f"Error parsing JSON response: {e}")
             print(f"Response text: {response_text[:500]}")
-            return self._generate_fallback_analysis(posts_data, {})
+            # Let analyze_profile fall back, so an unparseable reply is never cached
+            raise ValueError("Gemini response was not valid JSON") from e
 
     def _generate_fallback_analysis(self, posts_data: List[Dict], profile_info: Dict) -> Dict[str, Any]:
         """Generate a basic fallback analysis if AI analysis fails"""
@@ -242,17 +629,5 @@ IMPORTANT:
                 "life_attitude": "Shares content on social media regularly",
                 "notable_insights": f"This user has {len(posts_data)} posts analyzed."
             },
-            "posts_with_collages": [
-                {
-                    'post_number': idx + 1,
-                    'type': post.get('type', ''),
-                    'caption': post.get('caption', ''),
-                    'likes': post.get('likesCount', 0),
-                    'comments': post.get('commentsCount', 0),
-                    'url': post.get('url', ''),
-                    'collage_path': post.get('collage_path', ''),
-                    'timestamp': post.get('timestamp', '')
-                }
-                for idx, post in enumerate(posts_data)
-            ]
+            "posts_with_collages": self._posts_to_collage_entries(posts_data)
         }
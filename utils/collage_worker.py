@@ -0,0 +1,67 @@
+"""
+Worker processes for ImageProcessor(use_processes=True)
+
+Spawned workers import the module that defines their entry points, so these
+live apart from image_processor: importing this module has no side effects,
+and ImageProcessor is only imported once a worker starts. The pools are
+created on first use and shared by every later call in the process, so
+workers (and the fonts and session each one loads) outlive a single batch.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# One pool per (output_dir, max_workers), created on first use
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Per-process ImageProcessor, built by _init_worker
+_processor = None
+
+
+def get_pool(output_dir: str, max_workers: int) -> ProcessPoolExecutor:
+    """
+    Return the shared collage pool for output_dir, creating it on first use
+
+    Args:
+        output_dir: Collage directory the workers write to
+        max_workers: Worker process count
+
+    Returns:
+        ProcessPoolExecutor whose workers run process_post
+    """
+    key = (output_dir, max_workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # spawn, not fork: the app's threads may hold locks a forked child would inherit
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(output_dir,)
+            )
+            _pools[key] = pool
+        return pool
+
+
+def discard_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next get_pool call starts fresh workers"""
+    with _pools_lock:
+        for key, existing in list(_pools.items()):
+            if existing is pool:
+                del _pools[key]
+    pool.shutdown(wait=False)
+
+
+def _init_worker(output_dir: str):
+    """Create the worker process's ImageProcessor (fonts and session) once"""
+    global _processor
+    from utils.image_processor import ImageProcessor
+    _processor = ImageProcessor(output_dir=output_dir)
+
+
+def process_post(idx: int, post: dict):
+    """Build one post's collage in a worker process; returns (idx, collage_path)"""
+    return idx, _processor.process_post_collage(post, idx + 1)
@@ -0,0 +1,90 @@
+"""
+Small file-per-key cache for expensive API responses
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import orjson
+
+
+class DiskCache:
+    def __init__(self, cache_dir: str, ttl_seconds: int = 3600):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding one file per cached entry
+            ttl_seconds: Age after which an entry is ignored (0 or less disables the cache)
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Content-addressed key for any JSON-serializable parts"""
+        return hashlib.sha1(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None when missing, expired or unreadable; expired files are deleted"""
+        if self.ttl <= 0:
+            return None
+
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.unlink(path)
+                return None
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def set(self, key: str, value: Any):
+        """Store a value, replacing the file atomically so readers never see a partial entry"""
+        if self.ttl <= 0:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(value))
+        os.replace(tmp_path, path)
+
+    def purge(self) -> int:
+        """
+        Delete expired entries, and tmp files left behind by an interrupted set()
+
+        Entries are only otherwise removed when get() finds them expired, so keys
+        that are never asked for again need this periodic sweep.
+
+        Returns:
+            Number of files deleted
+        """
+        if self.ttl <= 0:
+            return 0
+
+        cutoff = time.time() - self.ttl
+        removed = 0
+        try:
+            entries = list(os.scandir(self.cache_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if not entry.name.endswith(('.json', '.tmp')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Removed concurrently, or a tmp file was renamed into place
+                pass
+        return removed
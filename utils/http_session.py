@@ -0,0 +1,38 @@
+"""
+Shared HTTP session with connection pooling and retries
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def make_session(pool_size: int = 32, retries: int = 5) -> requests.Session:
+    """
+    Create a session that keeps connections alive and retries transient failures
+
+    Args:
+        pool_size: Connections kept per host (match the download concurrency)
+        retries: Retries for connection errors and 429/5xx responses
+
+    Returns:
+        Configured requests.Session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET', 'HEAD'],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# Process-wide session used by the website scraper and media downloads
+SESSION = make_session()
@@ -3,31 +3,287 @@ Image processing utilities for creating collages and extracting video frames
 with parallel processing support
 """
 
+import errno
 import os
-import requests
+import hashlib
+import tempfile
+import time
 from PIL import Image, ImageDraw, ImageFont
 import cv2
 import numpy as np
 from io import BytesIO
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from functools import lru_cache
 import threading
+from utils.http_session import SESSION
+from utils import collage_worker
+
+# Cap on simultaneous CDN downloads across all processors and posts in this process
+MAX_CONCURRENT_DOWNLOADS = 16
+DOWNLOAD_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_DOWNLOADS)
+
+# Gap between sampled frames beyond which seeking (to the preceding keyframe)
+# beats grabbing every frame in between; Instagram encodes a keyframe every few seconds
+SEEK_GAP_FRAMES = 300
+
+# VAAPI/NVDEC/VideoToolbox decode where the OpenCV build supports it; builds
+# without hardware support ignore the hint and decode in software
+VIDEO_CAPTURE_PARAMS = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+
+# Largest video downloaded for frame extraction; Instagram posts are far smaller
+MAX_VIDEO_BYTES = 200 * 1024 * 1024
+
+# Instagram's video CDN rejects requests without a browser User-Agent
+VIDEO_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Opt-in: decode videos straight from the CDN while they download (see
+# ImageProcessor._extract_frames_streaming). Off by default; videos are downloaded
+# through the shared session first, then decoded from the temp file
+STREAM_VIDEOS = False
+VIDEO_STREAM_PARAMS = VIDEO_CAPTURE_PARAMS + [
+    cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 10000,
+    cv2.CAP_PROP_READ_TIMEOUT_MSEC, 30000,
+]
+# Streams hold their connection while decoding, so they get their own small cap
+# instead of keeping DOWNLOAD_SLOTS from image downloads
+MAX_CONCURRENT_VIDEO_STREAMS = 4
+VIDEO_STREAM_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_VIDEO_STREAMS)
+
+# tmpfs for temporary videos, used while it has this much room (Docker's default
+# /dev/shm is only 64 MB, and several videos may be in flight at once)
+VIDEO_TMPFS_DIR = '/dev/shm'
+VIDEO_TMPFS_MIN_FREE = 256 * 1024 * 1024
+
+# Name prefix of temporary video files, so ones orphaned by a crash can be swept
+VIDEO_TEMP_PREFIX = 'igvideo_'
+
+
+def check_video_headers(headers) -> None:
+    """Raise ValueError for error pages and videos larger than MAX_VIDEO_BYTES"""
+    content_type = headers.get('Content-Type', '')
+    if content_type.startswith(('text/', 'application/json')):
+        raise ValueError(f"not a video (Content-Type: {content_type})")
+    content_length = int(headers.get('Content-Length') or 0)
+    if content_length > MAX_VIDEO_BYTES:
+        raise ValueError(f"video too large ({content_length / 1024 / 1024:.0f} MB)")
+
+
+def video_temp_dir(fallback: str) -> str:
+    """
+    Directory for a temporary video download
+
+    OpenCV can only open videos by path, so the download can't stay in memory;
+    on tmpfs the write and the decoder's read at least never touch the disk.
+    """
+    try:
+        stats = os.statvfs(VIDEO_TMPFS_DIR)
+        if stats.f_bavail * stats.f_frsize >= VIDEO_TMPFS_MIN_FREE and os.access(VIDEO_TMPFS_DIR, os.W_OK):
+            return VIDEO_TMPFS_DIR
+    except (OSError, AttributeError):
+        # No /dev/shm, or no statvfs (Windows)
+        pass
+    return fallback
+
+
+def purge_video_temp_files(max_age_seconds: float = 3600) -> int:
+    """
+    Delete temporary video downloads a killed process left on the tmpfs
+
+    Extraction removes its own file when it finishes, so only files older than
+    max_age_seconds (far longer than any download) are treated as orphans.
+
+    Returns:
+        Number of files deleted
+    """
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    try:
+        entries = list(os.scandir(VIDEO_TMPFS_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.name.startswith(VIDEO_TEMP_PREFIX):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# (columns, rows) of the collage grid, indexed by image count (9 or more share 3x3)
+GRID_DIMS = ((1, 1), (1, 1), (2, 1), (2, 2), (2, 2), (3, 2), (3, 2), (3, 3), (3, 3), (3, 3))
+
+
+@lru_cache(maxsize=1)
+def load_fonts():
+    """Load the (regular, bold) collage fonts once per process"""
+    try:
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
+        font_bold = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 18)
+    except OSError:
+        font = ImageFont.load_default()
+        font_bold = ImageFont.load_default()
+    return font, font_bold
+
+
+# Per-thread collage canvas, reused across posts (see work_canvas)
+_canvas_local = threading.local()
+
+
+def work_canvas(height: int, width: int) -> np.ndarray:
+    """
+    Return a white height x width RGB buffer owned by the calling thread
+
+    The buffer only grows, so after the first 3x3 collage every post reuses
+    the same ~5 MB allocation instead of mapping a fresh one. Image.fromarray
+    copies RGB data, so the buffer is free for the next post as soon as the
+    collage image exists.
+    """
+    buffer = getattr(_canvas_local, 'buffer', None)
+    if buffer is None or buffer.shape[0] < height or buffer.shape[1] < width:
+        old_height, old_width = buffer.shape[:2] if buffer is not None else (0, 0)
+        buffer = np.empty((max(height, old_height), max(width, old_width), 3), dtype=np.uint8)
+        _canvas_local.buffer = buffer
+
+    canvas = buffer[:height, :width]
+    canvas.fill(255)
+    return canvas
+
+
+# libjpeg's reduced decode scales and the matching cv2.imread flags, coarsest first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def decode_image(data: bytes, size_hint: Tuple[int, int] = (400, 400)) -> Image.Image:
+    """
+    Decode image bytes to an RGB PIL image of at least size_hint
+
+    OpenCV's libjpeg-turbo decoder is used at the coarsest scale (1/8, 1/4,
+    1/2) that still covers size_hint, since collages only need 400px tiles.
+    Formats OpenCV can't decode fall back to PIL in draft mode.
+    """
+    img = Image.open(BytesIO(data))  # header only, for the dimensions
+    width, height = img.size
+
+    flags = cv2.IMREAD_COLOR
+    for scale, reduced in REDUCED_DECODE_FLAGS:
+        if width // scale >= size_hint[0] and height // scale >= size_hint[1]:
+            flags = reduced
+            break
+
+    bgr = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if bgr is not None:
+        return Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+
+    img.draft('RGB', size_hint)  # no-op for non-JPEG formats
+    return img.convert('RGB')
+
+
+def purge_collages(output_dir: str = "output/collages", max_age_seconds: float = 7 * 24 * 3600) -> int:
+    """
+    Delete collages, their Gemini sidecars and cached downloads older than max_age_seconds
+
+    Collage names carry a content hash, so nothing is ever overwritten and the
+    directory only grows unless it is swept. A file's age is its mtime, which a
+    rewrite of identical bytes refreshes.
+
+    Args:
+        output_dir: Collage directory of an ImageProcessor
+        max_age_seconds: Files last written before this many seconds ago are removed
+
+    Returns:
+        Number of files deleted
+    """
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for directory in (output_dir, os.path.join(output_dir, ".cache")):
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Removed concurrently (or a tmp file was renamed into place)
+                pass
+    return removed
 
 
 class ImageProcessor:
-    def __init__(self, output_dir="output/collages", max_workers=5):
-        """Initialize image processor with parallel processing support"""
+    def __init__(self, output_dir="output/collages", max_workers=5, session=None, use_processes=False):
+        """
+        Initialize image processor with parallel processing support
+
+        With use_processes, generate_collages_parallel runs each post in a worker
+        process (one per core at most) instead of a thread, so resizing and JPEG
+        encoding of different posts never contend for the GIL. Workers use the
+        default shared session, since a custom one can't be sent to them.
+        """
         self.output_dir = output_dir
         self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.session = session or SESSION
         self._lock = threading.Lock()
-        os.makedirs(output_dir, exist_ok=True)
+        self._font, self._font_bold = load_fonts()
+        self.cache_dir = os.path.join(output_dir, ".cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
 
-    def download_image(self, url: str) -> Image.Image:
-        """Download image from URL"""
+    def download_image(self, url: str, size_hint: Tuple[int, int] = (400, 400)) -> Image.Image:
+        """
+        Download image from URL, reusing the on-disk copy from an earlier run
+
+        Downloads are cached as their original bytes under cache_dir, keyed by
+        sha1(url), and decoded with decode_image. Bytes are only cached once
+        they decode, so an error page or truncated body is fetched again next
+        time instead of being served from the cache.
+        """
+        cache_path = os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest())
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            return Image.open(BytesIO(response.content)).convert('RGB')
+            try:
+                with open(cache_path, 'rb') as f:
+                    data = f.read()
+                cached = True
+            except FileNotFoundError:
+                with DOWNLOAD_SLOTS:
+                    response = self.session.get(url, timeout=10)
+                response.raise_for_status()
+                data = response.content
+                cached = False
+
+            try:
+                image = decode_image(data, size_hint)
+            except Exception:
+                if cached:
+                    # Left by an older version that cached before decoding
+                    os.remove(cache_path)
+                raise
+
+            if not cached:
+                tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, cache_path)
+                except OSError as e:
+                    # The image is already decoded; only the next run loses out
+                    print(f"Could not cache image from {url}: {e}")
+
+            return image
         except Exception as e:
             print(f"Error downloading image from {url}: {e}")
             # Return a placeholder image
@@ -36,19 +292,24 @@ class ImageProcessor:
     def download_video(self, url: str, output_path: str) -> str:
         """Download video from URL with proper headers"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
             print(f"Downloading video from: {url[:100]}...")
-            response = requests.get(url, headers=headers, timeout=60, stream=True)
-            response.raise_for_status()
-
             total_size = 0
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
+            # Closing the streamed response hands its connection back to the pool,
+            # even when the download fails part way
+            with DOWNLOAD_SLOTS, self.session.get(url, headers=VIDEO_HEADERS, timeout=60, stream=True) as response:
+                response.raise_for_status()
+
+                # Headers arrive before the body, so reject error pages and oversized
+                # files without reading them (and without a separate HEAD round trip)
+                check_video_headers(response.headers)
+
+                with open(output_path, 'wb') as f:
+                    # 1 MiB reads keep write() calls and loop iterations per video low
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
                         f.write(chunk)
                         total_size += len(chunk)
+                        if total_size > MAX_VIDEO_BYTES:
+                            raise ValueError("video too large (no Content-Length)")
 
             print(f"✓ Downloaded video: {total_size / 1024 / 1024:.2f} MB")
 
@@ -63,36 +324,71 @@ class ImageProcessor:
             print(f"✗ Error downloading video: {e}")
             if os.path.exists(output_path):
                 os.remove(output_path)
+            if isinstance(e, OSError) and e.errno in (errno.ENOSPC, errno.EDQUOT):
+                # The caller retries in a directory with room
+                raise
             return None
 
-    def download_images_parallel(self, image_urls: List[str]) -> List[Image.Image]:
+    def download_images_parallel(self, image_urls: List[str],
+                                 tile_size: Tuple[int, int] = None) -> List[Image.Image]:
         """
         Download multiple images in parallel for faster processing
 
         Args:
             image_urls: List of image URLs to download
+            tile_size: (width, height) to resize each image to in its download
+                thread, so resizes run concurrently too (default: keep decoded size)
 
         Returns:
             List of PIL Images
         """
-        images = [None] * len(image_urls)
+        def fetch(url):
+            img = self.download_image(url)
+            if tile_size and img.size != tile_size:
+                # cv2.resize releases the GIL, so tiles shrink in parallel
+                img = Image.fromarray(cv2.resize(np.asarray(img), tile_size, interpolation=cv2.INTER_AREA))
+            return img
+
+        if len(image_urls) <= 1:
+            return [fetch(url) for url in image_urls]
+
+        # One thread per image (DOWNLOAD_SLOTS bounds the total); map keeps URL order.
+        # download_image never raises, it returns a placeholder on failure.
+        with ThreadPoolExecutor(max_workers=min(len(image_urls), MAX_CONCURRENT_DOWNLOADS)) as executor:
+            return list(executor.map(fetch, image_urls))
+
+    @staticmethod
+    def _compose_grid(images: List, grid_cols: int, grid_rows: int,
+                      tile_size: Tuple[int, int], text_height: int = 150) -> Image.Image:
+        """
+        Lay images out as a grid of tiles above a white text area
 
-        def download_with_index(idx_url):
-            idx, url = idx_url
-            return idx, self.download_image(url)
+        Tiles are resized with OpenCV's INTER_AREA (much faster than PIL's
+        LANCZOS for large downscales, with no visible difference at tile size)
+        and copied into this thread's reusable canvas with array slicing.
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(download_with_index, (idx, url)): idx
-                      for idx, url in enumerate(image_urls)}
+        Args:
+            images: RGB PIL images or uint8 arrays, at most grid_cols * grid_rows
+            grid_cols: Number of tile columns
+            grid_rows: Number of tile rows
+            tile_size: (width, height) of each tile
+            text_height: Height of the blank area below the grid
 
-            for future in as_completed(futures):
-                try:
-                    idx, img = future.result()
-                    images[idx] = img
-                except Exception as e:
-                    print(f"Error in parallel download: {e}")
+        Returns:
+            Collage image ready for the text overlay
+        """
+        tile_w, tile_h = tile_size
+        canvas = work_canvas(grid_rows * tile_h + text_height, grid_cols * tile_w)
 
-        return images
+        for idx, img in enumerate(images):
+            row, col = divmod(idx, grid_cols)
+            y, x = row * tile_h, col * tile_w
+            tile = np.asarray(img)
+            if tile.shape[:2] != (tile_h, tile_w):
+                tile = cv2.resize(tile, tile_size, interpolation=cv2.INTER_AREA)
+            canvas[y:y + tile_h, x:x + tile_w] = tile
+
+        return Image.fromarray(canvas)
 
     def create_image_collage(self, image_urls: List[str], caption: str,
                            post_info: dict, output_filename: str) -> str:
@@ -111,49 +407,23 @@ class ImageProcessor:
         if not image_urls:
             return None
 
-        # Download all images in parallel for faster processing
-        images = self.download_images_parallel(image_urls)
-
-        # Calculate grid dimensions
-        num_images = len(images)
-        if num_images == 1:
-            grid_cols, grid_rows = 1, 1
-        elif num_images == 2:
-            grid_cols, grid_rows = 2, 1
-        elif num_images <= 4:
-            grid_cols, grid_rows = 2, 2
-        elif num_images <= 6:
-            grid_cols, grid_rows = 3, 2
-        else:
-            grid_cols, grid_rows = 3, 3
+        # Calculate grid dimensions (download_images_parallel returns one image per URL)
+        num_images = len(image_urls)
+        grid_cols, grid_rows = GRID_DIMS[min(num_images, 9)]
 
-        # Resize images to uniform size
+        # Download only the images that fit the grid, in parallel, each resized
+        # to a tile in its own thread
         img_width, img_height = 400, 400
-        resized_images = []
-        for img in images[:grid_cols * grid_rows]:  # Limit to grid size
-            resized_images.append(img.resize((img_width, img_height), Image.Resampling.LANCZOS))
-
-        # Create collage canvas
-        collage_width = grid_cols * img_width
-        collage_height = grid_rows * img_height + 150  # Extra space for text
-        collage = Image.new('RGB', (collage_width, collage_height), 'white')
-
-        # Paste images
-        for idx, img in enumerate(resized_images):
-            row = idx // grid_cols
-            col = idx % grid_cols
-            x = col * img_width
-            y = row * img_height
-            collage.paste(img, (x, y))
+        images = self.download_images_parallel(
+            image_urls[:grid_cols * grid_rows], tile_size=(img_width, img_height)
+        )
+
+        # Lay the tiles out on the collage canvas
+        collage = self._compose_grid(images, grid_cols, grid_rows, (img_width, img_height))
 
         # Add text information
         draw = ImageDraw.Draw(collage)
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-            font_bold = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 18)
-        except:
-            font = ImageFont.load_default()
-            font_bold = ImageFont.load_default()
+        font, font_bold = self._font, self._font_bold
 
         # Text area starts after images
         text_y = grid_rows * img_height + 10
@@ -172,24 +442,89 @@ class ImageProcessor:
         draw.text((10, text_y + 80), post_type, fill='gray', font=font)
 
         # Save collage
-        output_path = os.path.join(self.output_dir, output_filename)
-        collage.save(output_path, quality=85)
+        output_path = self._save_collage(collage, output_filename)
         print(f"Saved image collage: {output_path}")
         return output_path
 
-    def extract_video_frames(self, video_url: str, num_frames=9) -> List[Image.Image]:
+    def _save_collage(self, collage: Image.Image, output_filename: str) -> str:
+        """
+        Encode a collage as JPEG and save it under a content-hashed filename
+
+        The hash makes each filename immutable, so browsers can cache
+        collages indefinitely.
+
+        Args:
+            collage: Finished collage image
+            output_filename: Base filename, e.g. post_1_collage.jpg
+
+        Returns:
+            Path to saved collage
+        """
+        buffer = BytesIO()
+        # Single-pass baseline encode with 4:2:0 chroma; the text is black/gray so it stays crisp
+        collage.save(buffer, 'JPEG', quality=85, subsampling=2, progressive=False, optimize=False)
+        data = buffer.getvalue()
+
+        stem, ext = os.path.splitext(output_filename)
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        output_path = os.path.join(self.output_dir, f"{stem}_{digest}{ext}")
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return output_path
+
+    def extract_video_frames(self, video_url: str, num_frames=9,
+                             frame_size: Tuple[int, int] = None) -> List[np.ndarray]:
         """
         Extract evenly-spaced frames from a video
 
         Args:
             video_url: URL of the video
             num_frames: Number of frames to extract (default: 9)
+            frame_size: (width, height) to resize each frame to right after decoding,
+                before color conversion (default: full resolution)
 
         Returns:
-            List of PIL Images
+            List of RGB uint8 arrays (height x width x 3), ready for _compose_grid
+            without a PIL round trip
         """
-        # Download video to temporary file
-        temp_video_path = os.path.join(self.output_dir, "temp_video.mp4")
+        if STREAM_VIDEOS:
+            frames = self._extract_frames_streaming(video_url, num_frames, frame_size)
+            if frames is not None:
+                return frames
+            print(f"Streaming decode failed, downloading video first")
+
+        # The tmpfs had room when checked, but downloads running in parallel can
+        # still fill it; retry on disk rather than losing the video's collage
+        temp_dir = video_temp_dir(self.output_dir)
+        try:
+            return self._extract_frames_via_temp_file(video_url, temp_dir, num_frames, frame_size)
+        except OSError as e:
+            if temp_dir == self.output_dir:
+                print(f"✗ Could not write temporary video: {e}")
+                return []
+            print(f"Temporary video did not fit in {temp_dir} ({e}), retrying in {self.output_dir}")
+
+        try:
+            return self._extract_frames_via_temp_file(video_url, self.output_dir, num_frames, frame_size)
+        except OSError as e:
+            print(f"✗ Could not write temporary video: {e}")
+            return []
+
+    def _extract_frames_via_temp_file(self, video_url: str, temp_dir: str, num_frames: int,
+                                      frame_size: Tuple[int, int] = None) -> List[np.ndarray]:
+        """Extract frames through a temporary download in temp_dir, removed afterwards"""
+        # Unique to this call, so parallel video collages never share (and clobber) one path
+        fd, temp_video_path = tempfile.mkstemp(prefix=VIDEO_TEMP_PREFIX, suffix='.mp4', dir=temp_dir)
+        os.close(fd)
+        try:
+            return self._extract_frames_from_file(video_url, temp_video_path, num_frames, frame_size)
+        finally:
+            if os.path.exists(temp_video_path):
+                os.remove(temp_video_path)
+
+    def _extract_frames_from_file(self, video_url: str, temp_video_path: str, num_frames: int,
+                                  frame_size: Tuple[int, int] = None) -> List[np.ndarray]:
+        """Download the video to temp_video_path and decode num_frames evenly-spaced frames"""
         video_path = self.download_video(video_url, temp_video_path)
 
         if not video_path:
@@ -211,52 +546,116 @@ class ImageProcessor:
                 print(f"✗ Video file is empty")
                 return []
 
-            # Open video
-            cap = cv2.VideoCapture(video_path)
+            # Open video, letting FFmpeg use a hardware decoder when one is available
+            cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, VIDEO_CAPTURE_PARAMS)
+            if not cap.isOpened():
+                cap.release()
+                cap = cv2.VideoCapture(video_path)
 
             if not cap.isOpened():
                 print(f"✗ OpenCV cannot open video file")
                 cap.release()
                 return []
 
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            duration = total_frames / fps if fps > 0 else 0
-
-            print(f"Video info: {total_frames} frames, {fps:.2f} fps, {duration:.2f}s duration")
-
-            if total_frames == 0:
-                print(f"✗ Video has 0 frames")
+            try:
+                frames = self._read_frames(cap, num_frames, frame_size)
+            finally:
                 cap.release()
-                return []
 
-            if total_frames < num_frames:
-                num_frames = total_frames
+            print(f"✓ Extracted {len(frames)} frames from video")
 
-            # Calculate frame indices to extract
-            frame_indices = np.linspace(0, total_frames - 1, num_frames, dtype=int)
+        except Exception as e:
+            print(f"✗ Error extracting frames from video: {e}")
+            import traceback
+            traceback.print_exc()
 
-            for idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if ret:
-                    # Convert BGR to RGB
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    pil_image = Image.fromarray(frame_rgb)
-                    frames.append(pil_image)
+        return frames
 
-            cap.release()
+    def _extract_frames_streaming(self, video_url: str, num_frames: int,
+                                  frame_size: Tuple[int, int] = None) -> Optional[List[np.ndarray]]:
+        """
+        Decode frames with FFmpeg reading the video URL directly
 
-            print(f"✓ Extracted {len(frames)} frames from video")
+        A HEAD request through the shared session validates the URL first, with
+        the same Content-Type and size checks as download_video; FFmpeg then
+        opens the final (redirected) URL, decoding while the rest arrives and
+        using range requests to seek. FFmpeg sends its own User-Agent, which
+        OpenCV only lets a process set globally, so hosts that reject it fail
+        here and fall back to the download path.
 
-            # Clean up temp video file
-            if os.path.exists(temp_video_path):
-                os.remove(temp_video_path)
+        Returns:
+            The frames, or None if streaming failed or returned fewer frames
+            than the video has to offer
+        """
+        try:
+            with DOWNLOAD_SLOTS:
+                probe = self.session.head(video_url, headers=VIDEO_HEADERS, timeout=10, allow_redirects=True)
+            probe.raise_for_status()
+            check_video_headers(probe.headers)
 
+            with VIDEO_STREAM_SLOTS:
+                cap = cv2.VideoCapture(probe.url, cv2.CAP_FFMPEG, VIDEO_STREAM_PARAMS)
+                try:
+                    if not cap.isOpened():
+                        return None
+                    # Short clips have fewer frames than requested; that is still complete
+                    expected = min(num_frames, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+                    frames = self._read_frames(cap, num_frames, frame_size)
+                finally:
+                    cap.release()
         except Exception as e:
-            print(f"✗ Error extracting frames from video: {e}")
-            import traceback
-            traceback.print_exc()
+            print(f"✗ Error streaming video frames: {e}")
+            return None
+
+        if expected <= 0 or len(frames) < expected:
+            return None
+
+        print(f"✓ Extracted {len(frames)} frames from video stream")
+        return frames
+
+    @staticmethod
+    def _read_frames(cap, num_frames: int, frame_size: Tuple[int, int] = None) -> List[np.ndarray]:
+        """Decode num_frames evenly-spaced frames from an open capture as RGB arrays"""
+        frames = []
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = total_frames / fps if fps > 0 else 0
+
+        print(f"Video info: {total_frames} frames, {fps:.2f} fps, {duration:.2f}s duration")
+
+        if total_frames == 0:
+            print(f"✗ Video has 0 frames")
+            return []
+
+        if total_frames < num_frames:
+            num_frames = total_frames
+
+        # Calculate frame indices to extract
+        frame_indices = sorted(set(np.linspace(0, total_frames - 1, num_frames, dtype=int).tolist()))
+
+        # Walk forward with grab() and retrieve() only the targets. Across long
+        # gaps, seek instead: FFmpeg jumps to the preceding keyframe and decodes
+        # only from there, rather than every frame in between
+        position = 0  # index of the frame the next grab() returns
+        for target in frame_indices:
+            if target - position > SEEK_GAP_FRAMES:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+
+            grabbed = True
+            while grabbed and position <= target:
+                grabbed = cap.grab()
+                position += 1
+            if not grabbed:
+                break
+
+            ret, frame = cap.retrieve()
+            if ret:
+                if frame_size:
+                    # Shrink first so color conversion and PIL only see tile-sized pixels
+                    frame = cv2.resize(frame, frame_size, interpolation=cv2.INTER_AREA)
+                # Convert BGR to RGB
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
 
         return frames
 
@@ -274,8 +673,10 @@ class ImageProcessor:
         Returns:
             Path to saved collage
         """
-        # Extract 9 frames
-        frames = self.extract_video_frames(video_url, num_frames=9)
+        img_width, img_height = 400, 400
+
+        # Extract 9 frames, already at tile size
+        frames = self.extract_video_frames(video_url, num_frames=9, frame_size=(img_width, img_height))
 
         if not frames:
             print(f"Failed to extract frames from video: {video_url}")
@@ -283,33 +684,13 @@ class ImageProcessor:
 
         # Create 3x3 grid
         grid_cols, grid_rows = 3, 3
-        img_width, img_height = 400, 400
-
-        # Resize frames
-        resized_frames = [frame.resize((img_width, img_height), Image.Resampling.LANCZOS)
-                         for frame in frames[:9]]
 
-        # Create collage canvas
-        collage_width = grid_cols * img_width
-        collage_height = grid_rows * img_height + 150  # Extra space for text
-        collage = Image.new('RGB', (collage_width, collage_height), 'white')
-
-        # Paste frames
-        for idx, frame in enumerate(resized_frames):
-            row = idx // grid_cols
-            col = idx % grid_cols
-            x = col * img_width
-            y = row * img_height
-            collage.paste(frame, (x, y))
+        # Resize frames onto the collage canvas
+        collage = self._compose_grid(frames[:9], grid_cols, grid_rows, (img_width, img_height))
 
         # Add text information
         draw = ImageDraw.Draw(collage)
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-            font_bold = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 18)
-        except:
-            font = ImageFont.load_default()
-            font_bold = ImageFont.load_default()
+        font, font_bold = self._font, self._font_bold
 
         # Text area
         text_y = grid_rows * img_height + 10
@@ -329,8 +710,7 @@ class ImageProcessor:
         draw.text((10, text_y + 80), "🎥 Video (9 frames)", fill='gray', font=font)
 
         # Save collage
-        output_path = os.path.join(self.output_dir, output_filename)
-        collage.save(output_path, quality=85)
+        output_path = self._save_collage(collage, output_filename)
         print(f"Saved video collage: {output_path}")
         return output_path
 
@@ -398,30 +778,50 @@ class ImageProcessor:
             print(f"Error creating collage for post {post_num}: {e}")
             return None
 
-    def generate_collages_parallel(self, posts: List[dict]) -> List[dict]:
+    def generate_collages_parallel(self, posts: Iterable[dict], on_complete=None) -> List[dict]:
         """
         Generate collages for multiple posts in parallel
 
         Args:
-            posts: List of post data dictionaries
+            posts: Post data dictionaries; a generator works too, and each post
+                starts as soon as it is produced
+            on_complete: Optional callback invoked with each collage path as soon as it is saved
 
         Returns:
             Updated posts with collage_path added
         """
-        print(f"\nGenerating collages for {len(posts)} posts in parallel (max {self.max_workers} workers)...")
+        if self.use_processes:
+            max_workers = min(self.max_workers, os.cpu_count() or 1)
+            # Shared across calls, so it is not shut down when this batch ends
+            executor = collage_worker.get_pool(self.output_dir, max_workers)
+            pool_context = nullcontext(executor)
+            process_with_index = collage_worker.process_post
+        else:
+            max_workers = self.max_workers
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            pool_context = executor
+
+            def process_with_index(idx, post):
+                return idx, self.process_post_collage(post, idx + 1)
 
-        def process_with_index(idx_post):
-            idx, post = idx_post
-            post_num = idx + 1
-            collage_path = self.process_post_collage(post, post_num)
-            return idx, collage_path
+        kind = 'processes' if self.use_processes else 'workers'
+        print(f"\nGenerating collages in parallel (max {max_workers} {kind})...")
 
-        # Process posts in parallel
-        collage_paths = [None] * len(posts)
+        # Process posts in parallel, submitting each one as it arrives
+        submitted = []
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(process_with_index, (idx, post)): idx
-                      for idx, post in enumerate(posts)}
+        with pool_context:
+            futures = {}
+            for idx, post in enumerate(posts):
+                submitted.append(post)
+                try:
+                    futures[executor.submit(process_with_index, idx, post)] = idx
+                except BrokenProcessPool:
+                    collage_worker.discard_pool(executor)
+                    raise
+
+            posts = submitted
+            collage_paths = [None] * len(posts)
 
             completed = 0
             for future in as_completed(futures):
@@ -430,8 +830,13 @@ class ImageProcessor:
                     collage_paths[idx] = collage_path
                     completed += 1
                     print(f"  Progress: {completed}/{len(posts)} collages completed")
+                    if on_complete and collage_path:
+                        on_complete(collage_path)
                 except Exception as e:
                     print(f"Error in parallel collage generation: {e}")
+                    if isinstance(e, BrokenProcessPool):
+                        # A worker died; the next batch gets a fresh pool
+                        collage_worker.discard_pool(executor)
 
         # Update posts with collage paths
         for idx, post in enumerate(posts):
@@ -439,3 +844,4 @@ class ImageProcessor:
 
         print(f"✓ Completed {len(posts)} collages in parallel!\n")
         return posts
+
@@ -0,0 +1,53 @@
+"""
+Logging filter that collapses bursts of identical errors into one line
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class RepeatedErrorFilter(logging.Filter):
+    def __init__(self, window_seconds: float = 60.0, max_keys: int = 1024):
+        """
+        Initialize the filter
+
+        Args:
+            window_seconds: Repeats of the same error within this window are counted instead of logged
+            max_keys: Distinct errors tracked at once; the one whose window started
+                longest ago is forgotten first (its pending repeat count is lost)
+        """
+        super().__init__()
+        self.window = window_seconds
+        self.max_keys = max_keys
+        # key -> (window start, suppressed count), ordered by window start
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(record: logging.LogRecord):
+        """Identify an error by its message template and exception"""
+        exc = record.exc_info[1] if record.exc_info else None
+        return record.msg, type(exc).__name__, str(exc)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Let the first error of a burst through, annotated with how many were suppressed"""
+        if record.levelno < logging.ERROR:
+            return True
+
+        key = self._key(record)
+        now = time.monotonic()
+        with self._lock:
+            first_seen, suppressed = self._seen.get(key, (None, 0))
+            if first_seen is not None and now - first_seen < self.window:
+                self._seen[key] = (first_seen, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+
+        if suppressed:
+            record.msg = f"{record.msg} (repeated {suppressed} more times since last logged)"
+        return True
@@ -0,0 +1,62 @@
+"""
+Token-bucket rate limiter for outbound API calls
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+class RateLimiter:
+    def __init__(self, rpm: int, burst: int = 1):
+        """
+        Initialize a token bucket
+
+        Args:
+            rpm: Requests allowed per minute (0 or less disables limiting)
+            burst: Maximum number of requests allowed back to back
+        """
+        self.rpm = rpm
+        self.rate = rpm / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Add tokens for the time elapsed since the last refill"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, on_wait: Optional[Callable[[float], None]] = None) -> float:
+        """
+        Block until a request may be sent
+
+        The lock only guards the bucket arithmetic; on_wait and the sleep run
+        after it is released, so a slow callback never holds up other callers.
+
+        Args:
+            on_wait: Called with the expected delay in seconds before each wait
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.rpm <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+
+            if on_wait:
+                on_wait(delay)
+
+            started = time.monotonic()
+            time.sleep(delay)
+            waited += time.monotonic() - started
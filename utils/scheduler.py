@@ -0,0 +1,53 @@
+"""
+Minimal interval scheduler for background maintenance jobs
+"""
+
+import logging
+import threading
+from typing import Callable
+
+# The app's logger, so job failures share its queue handler and repeat filter
+logger = logging.getLogger('analyzer')
+
+
+class IntervalScheduler:
+    def __init__(self):
+        """Initialize an empty scheduler"""
+        self._jobs = []
+        self._threads = []
+        self._stop = threading.Event()
+
+    def add_job(self, func: Callable[[], object], seconds: float, name: str = None):
+        """
+        Register a job to run every `seconds` once the scheduler starts
+
+        Args:
+            func: Callable with no arguments
+            seconds: Interval between runs
+            name: Label used in error messages (default: function name)
+        """
+        self._jobs.append((func, seconds, name or getattr(func, '__name__', 'job')))
+
+    def start(self):
+        """Start one daemon thread per job"""
+        for func, seconds, name in self._jobs:
+            thread = threading.Thread(
+                target=self._run_job,
+                args=(func, seconds, name),
+                name=f"scheduler-{name}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _run_job(self, func, seconds, name):
+        """Run func every `seconds` until shutdown; errors never stop the loop"""
+        while not self._stop.wait(seconds):
+            try:
+                func()
+            except Exception:
+                logger.exception("Scheduled job %s failed", name)
+
+    def shutdown(self):
+        """Stop all job loops"""
+        self._stop.set()
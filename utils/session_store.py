@@ -0,0 +1,77 @@
+"""
+Bounded in-memory store for analysis sessions
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+# The app's logger, so warnings share its queue handler and repeat filter
+logger = logging.getLogger('analyzer')
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 128, ttl_seconds: int = 3600):
+        """
+        Initialize an LRU session store
+
+        Args:
+            max_sessions: Maximum number of sessions kept before the least recently used is evicted
+            ttl_seconds: How long a finished session is kept after it completed (see gc())
+        """
+        self.max_sessions = max_sessions
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, session: Any):
+        """Add a session, evicting the least recently used one when the store is full"""
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, evicted = self._sessions.popitem(last=False)
+                if evicted.status != 'completed':
+                    logger.warning("Evicted session %s while still '%s'", evicted_id, evicted.status)
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """Return a session and mark it as recently used"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def gc(self) -> int:
+        """
+        Drop finished sessions older than the TTL
+
+        Returns:
+            Number of sessions removed
+        """
+        cutoff = datetime.now() - self.ttl
+        with self._lock:
+            expired = []
+            for session_id, session in self._sessions.items():
+                finished_at = self._finished_at(session)
+                if finished_at and finished_at < cutoff:
+                    expired.append(session_id)
+
+            for session_id in expired:
+                del self._sessions[session_id]
+        return len(expired)
+
+    @staticmethod
+    def _finished_at(session: Any) -> Optional[datetime]:
+        """Completion time of a session, or its start time if it failed"""
+        if session.completed_at:
+            return session.completed_at
+        if session.status == 'error':
+            return session.started_at
+        return None
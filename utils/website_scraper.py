@@ -2,15 +2,41 @@
 Website scraping utility for extracting information from personal websites
 """
 
-import requests
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
 import re
+from utils.http_session import SESSION
+
+# lxml's C parser is several times faster than html.parser on real pages
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Pages are parsed from at most this many bytes, bounding parse time and memory
+MAX_HTML_BYTES = 2 * 1024 * 1024
+
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+
+# Social network domains; subdomains (www., m., uk.) match through their parent domain
+SOCIAL_DOMAINS = {
+    'twitter.com': 'twitter',
+    'x.com': 'twitter',
+    'instagram.com': 'instagram',
+    'linkedin.com': 'linkedin',
+    'github.com': 'github',
+    'facebook.com': 'facebook',
+    'youtube.com': 'youtube',
+    'tiktok.com': 'tiktok'
+}
 
 
 class WebsiteScraper:
-    def __init__(self):
+    def __init__(self, session=None):
         """Initialize website scraper"""
+        self.session = session or SESSION
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
@@ -30,22 +56,30 @@ class WebsiteScraper:
 
         try:
             print(f"Scraping website: {url}")
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            soup = BeautifulSoup(self._fetch_html(url), HTML_PARSER)
+
+            # Walk the tree once per kind of element and share the results between helpers
+            metas = soup.find_all('meta')
+            title = self._get_title(soup, metas)
+            description = self._get_description(soup, metas)
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Text, links and emails come from the page without its boilerplate
+            for element in soup(['script', 'style', 'nav', 'footer', 'header']):
+                element.decompose()
+            text = soup.get_text()
+            links, social_links = self._get_links(soup.find_all('a', href=True), url)
 
             # Extract data
             data = {
                 'url': url,
-                'title': self._get_title(soup),
-                'description': self._get_description(soup),
-                'text_content': self._get_text_content(soup),
-                'links': self._get_links(soup, url),
-                'emails': self._extract_emails(soup),
-                'social_links': self._extract_social_links(soup),
-                'keywords': self._extract_keywords(soup),
-                'images': self._get_images(soup, url)[:10]  # Limit to 10 images
+                'title': title,
+                'description': description,
+                'text_content': self._get_text_content(text),
+                'links': links,
+                'emails': self._extract_emails(text),
+                'social_links': social_links,
+                'keywords': self._extract_keywords(metas),
+                'images': self._get_images(soup, url, limit=10)
             }
 
             print(f"Successfully scraped website: {url}")
@@ -55,15 +89,50 @@ class WebsiteScraper:
             print(f"Error scraping website {url}: {e}")
             return {'url': url, 'error': str(e)}
 
-    def _get_title(self, soup: BeautifulSoup) -> str:
+    def _fetch_html(self, url: str) -> bytes:
+        """Download a page, keeping at most MAX_HTML_BYTES of it"""
+        with self.session.get(url, headers=self.headers, timeout=10, stream=True) as response:
+            response.raise_for_status()
+
+            # Stop reading once the cap is reached; the parser copes with a truncated page
+            parts = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                parts.append(chunk)
+                size += len(chunk)
+                if size >= MAX_HTML_BYTES:
+                    break
+
+        return b''.join(parts)[:MAX_HTML_BYTES]
+
+    @staticmethod
+    def _social_platform(href: str) -> Optional[str]:
+        """Social platform a link points to, looked up by its host and parent domains"""
+        host = urlparse(href).hostname or ''
+        while host:
+            platform = SOCIAL_DOMAINS.get(host)
+            if platform:
+                return platform
+            host = host.partition('.')[2]
+        return None
+
+    @staticmethod
+    def _meta_content(metas: list, attr: str, value: str) -> str:
+        """Content of the first meta tag whose attr equals value, or ''"""
+        for meta in metas:
+            if meta.get(attr) == value and meta.get('content'):
+                return meta['content'].strip()
+        return ''
+
+    def _get_title(self, soup: BeautifulSoup, metas: list) -> str:
         """Extract page title"""
         if soup.title:
             return soup.title.string.strip()
 
         # Try og:title
-        og_title = soup.find('meta', property='og:title')
-        if og_title and og_title.get('content'):
-            return og_title['content'].strip()
+        og_title = self._meta_content(metas, 'property', 'og:title')
+        if og_title:
+            return og_title
 
         # Try h1
         h1 = soup.find('h1')
@@ -72,17 +141,13 @@ class WebsiteScraper:
 
         return ''
 
-    def _get_description(self, soup: BeautifulSoup) -> str:
+    def _get_description(self, soup: BeautifulSoup, metas: list) -> str:
         """Extract page description"""
-        # Try meta description
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            return meta_desc['content'].strip()
-
-        # Try og:description
-        og_desc = soup.find('meta', property='og:description')
-        if og_desc and og_desc.get('content'):
-            return og_desc['content'].strip()
+        # Try meta description, then og:description
+        description = (self._meta_content(metas, 'name', 'description')
+                       or self._meta_content(metas, 'property', 'og:description'))
+        if description:
+            return description
 
         # Get first paragraph
         p = soup.find('p')
@@ -91,14 +156,8 @@ class WebsiteScraper:
 
         return ''
 
-    def _get_text_content(self, soup: BeautifulSoup) -> str:
-        """Extract main text content"""
-        # Remove script and style elements
-        for script in soup(['script', 'style', 'nav', 'footer', 'header']):
-            script.decompose()
-
-        # Get text
-        text = soup.get_text()
+    def _get_text_content(self, text: str) -> str:
+        """Clean up the page text (boilerplate elements already removed)"""
         # Clean up whitespace
         lines = (line.strip() for line in text.splitlines())
         chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
@@ -107,75 +166,60 @@ class WebsiteScraper:
         # Limit text length
         return text[:5000]
 
-    def _get_links(self, soup: BeautifulSoup, base_url: str) -> List[str]:
-        """Extract links from page"""
-        links = []
-        for a in soup.find_all('a', href=True):
+    def _get_links(self, anchors: list, base_url: str) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Extract page links and social media profiles in one pass over the anchors
+
+        Returns:
+            (first 20 unique absolute links in page order, first link per social platform)
+        """
+        links = {}  # insertion-ordered set
+        social_links = {}
+        for a in anchors:
             href = a['href']
-            if href.startswith('http'):
-                links.append(href)
-            elif href.startswith('/'):
-                from urllib.parse import urljoin
-                links.append(urljoin(base_url, href))
+            if len(links) < 20:  # Limit to 20 unique links
+                if href.startswith('http'):
+                    links[href] = None
+                elif href.startswith('/'):
+                    links[urljoin(base_url, href)] = None
+
+            platform = self._social_platform(href)
+            if platform and platform not in social_links:
+                social_links[platform] = href
 
-        return list(set(links))[:20]  # Limit to 20 unique links
+        return list(links), social_links
 
-    def _get_images(self, soup: BeautifulSoup, base_url: str) -> List[str]:
-        """Extract image URLs"""
-        images = []
+    def _get_images(self, soup: BeautifulSoup, base_url: str, limit: int = None) -> List[str]:
+        """Extract unique image URLs in page order, stopping after limit of them"""
+        images = {}  # insertion-ordered set
         for img in soup.find_all('img', src=True):
             src = img['src']
             if src.startswith('http'):
-                images.append(src)
+                images[src] = None
             elif src.startswith('/'):
-                from urllib.parse import urljoin
-                images.append(urljoin(base_url, src))
+                images[urljoin(base_url, src)] = None
+            if limit and len(images) >= limit:
+                break
 
-        return list(set(images))
+        return list(images)
 
-    def _extract_emails(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_emails(self, text: str) -> List[str]:
         """Extract email addresses"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        text = soup.get_text()
-        emails = re.findall(email_pattern, text)
-        return list(set(emails))
-
-    def _extract_social_links(self, soup: BeautifulSoup) -> Dict[str, str]:
-        """Extract social media links"""
-        social_platforms = {
-            'twitter': ['twitter.com', 'x.com'],
-            'instagram': ['instagram.com'],
-            'linkedin': ['linkedin.com'],
-            'github': ['github.com'],
-            'facebook': ['facebook.com'],
-            'youtube': ['youtube.com'],
-            'tiktok': ['tiktok.com']
-        }
-
-        social_links = {}
-        for a in soup.find_all('a', href=True):
-            href = a['href']
-            for platform, domains in social_platforms.items():
-                if any(domain in href for domain in domains):
-                    if platform not in social_links:
-                        social_links[platform] = href
-
-        return social_links
+        return list(dict.fromkeys(EMAIL_PATTERN.findall(text)))
 
-    def _extract_keywords(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_keywords(self, metas: list) -> List[str]:
         """Extract keywords from meta tags"""
         keywords = []
 
         # Try meta keywords
-        meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-        if meta_keywords and meta_keywords.get('content'):
-            keywords.extend([k.strip() for k in meta_keywords['content'].split(',')])
+        meta_keywords = self._meta_content(metas, 'name', 'keywords')
+        if meta_keywords:
+            keywords.extend([k.strip() for k in meta_keywords.split(',')])
 
         # Try meta tags
-        og_tags = soup.find_all('meta', property=lambda x: x and x.startswith('og:'))
-        for tag in og_tags:
+        for tag in metas:
             content = tag.get('content', '')
-            if content:
+            if content and (tag.get('property') or '').startswith('og:'):
                 keywords.append(content)
 
-        return list(set(keywords))[:10]
+        return list(dict.fromkeys(keywords))[:10]